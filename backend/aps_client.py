@@ -2,25 +2,71 @@ import os
 import base64
 import requests
 import time
-from urllib.parse import quote
+from urllib.parse import quote, urlsplit
 from typing import Optional, Dict, Any
 from dotenv import load_dotenv
 import json
 
+import svf_reader
+from tracing import tracer, KIND_CLIENT
+from profiling import hot_path
+
 load_dotenv()
 
+# Tokens handed to the viewer keep at least this many seconds of lifetime
+VIEWER_TOKEN_MIN_LIFETIME = 300
+
 class APSClient:
-    def __init__(self):
-        self.client_id = os.getenv("APS_CLIENT_ID")
-        self.client_secret = os.getenv("APS_CLIENT_SECRET")
-        self.bucket_key = os.getenv('APS_BUCKET_KEY', 'enhanced-revit-viewer-v3')
-        self.base_url = "https://developer.api.autodesk.com"
+    def __init__(self, region: str = 'US', base_url: Optional[str] = None, bucket_key: Optional[str] = None,
+                 client_id: Optional[str] = None, client_secret: Optional[str] = None, name: str = 'default'):
+        self.name = name
+        self.client_id = client_id or os.getenv("APS_CLIENT_ID")
+        self.client_secret = client_secret or os.getenv("APS_CLIENT_SECRET")
+        self.bucket_key = bucket_key or os.getenv('APS_BUCKET_KEY', 'enhanced-revit-viewer-v3')
+        self.base_url = base_url or "https://developer.api.autodesk.com"
+        self.region = region
         self.access_token = None
         self.token_expires_at = 0
+        self.bucket_verified = False
+        # Called with the time to response headers of every request to base_url (not S3)
+        self.latency_observer = None
+        # Rate-limit and credential state, used by the credential pool to skip this client
+        self.throttled_until = 0.0
+        self.revoked = False
 
         if not self.client_id or not self.client_secret:
             raise ValueError("APS_CLIENT_ID and APS_CLIENT_SECRET must be set")
 
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Issue an HTTP request inside a client span"""
+        parts = urlsplit(url)
+        # Only scheme, host and path are recorded; signed URLs carry credentials in the query
+        with tracer.span(f"HTTP {method}", kind=KIND_CLIENT, **{
+            'http.method': method,
+            'http.url': f"{parts.scheme}://{parts.netloc}{parts.path}"
+        }) as span:
+            with hot_path(f"aps.{method}"):
+                response = requests.request(method, url, **kwargs)
+            if self.latency_observer and url.startswith(self.base_url):
+                # elapsed stops at the headers, so large bodies do not count as latency
+                self.latency_observer(response.elapsed.total_seconds())
+            if response.status_code == 429 and url.startswith(self.base_url):
+                retry_after = response.headers.get('Retry-After', '')
+                self.throttled_until = time.time() + (float(retry_after) if retry_after.isdigit() else 30.0)
+                span.set_attribute('aps.throttled', True)
+                print(f"⚠️ APS throttled credential '{self.name}' for {self.throttled_until - time.time():.0f}s")
+            span.set_attribute('http.status_code', response.status_code)
+            return response
+
+    @property
+    def available(self) -> bool:
+        """False while this credential is throttled or after it has been rejected"""
+        return not self.revoked and time.time() >= self.throttled_until
+
+    def _region_headers(self) -> Dict[str, str]:
+        """Region headers for Model Derivative calls; 'region' is the newer spelling of the same setting"""
+        return {'x-ads-region': self.region, 'region': self.region}
+
     def get_access_token(self, force_refresh: bool = False):
         """Get OAuth v2 access token with proper scope for Model Derivative"""
         current_time = time.time()
@@ -45,7 +91,7 @@ class APSClient:
         }
         
         try:
-            response = requests.post(url, headers=headers, data=data)
+            response = self._request('POST', url, headers=headers, data=data)
             response.raise_for_status()
 
             token_data = response.json()
@@ -57,28 +103,34 @@ class APSClient:
             return self.access_token
             
         except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 403:
+            if e.response.status_code in (401, 403):
+                self.revoked = True
                 raise ValueError(f"APS Authentication failed - check your CLIENT_ID and CLIENT_SECRET. Error: {e.response.text}")
             raise
         except Exception as e:
             raise Exception(f"Failed to get APS access token: {str(e)}")
 
-    def ensure_bucket_exists(self):
+    def ensure_bucket_exists(self, force_check: bool = False):
         """Create bucket with persistent policy for Model Derivative compatibility"""
+        # The bucket only needs checking once per process unless a probe asks for it
+        if self.bucket_verified and not force_check:
+            return True
+
         token = self.get_access_token()
         headers = {
             'Authorization': f'Bearer {token}',
             'Content-Type': 'application/json'
         }
         url = f"{self.base_url}/oss/v2/buckets/{self.bucket_key}/details"
-        response = requests.get(url, headers=headers)
+        response = self._request('GET', url, headers=headers)
 
         if response.status_code == 200:
             print(f"✅ Bucket '{self.bucket_key}' exists")
+            self.bucket_verified = True
             return True
 
         if response.status_code == 404:
-            print(f"📦 Creating bucket '{self.bucket_key}'...")
+            print(f"📦 Creating bucket '{self.bucket_key}' in region {self.region}...")
             url = f"{self.base_url}/oss/v2/buckets"
             
             # Use persistent policy for Model Derivative compatibility
@@ -87,9 +139,12 @@ class APSClient:
                 "policyKey": "persistent"
             }
 
-            response = requests.post(url, headers=headers, json=data)
+            # Buckets are pinned to a region at creation time
+            create_headers = {**headers, 'x-ads-region': self.region}
+            response = self._request('POST', url, headers=create_headers, json=data)
             if response.status_code in [200, 409]:
                 print(f"✅ Bucket '{self.bucket_key}' created with persistent policy")
+                self.bucket_verified = True
                 return True
             else:
                 print(f"❌ Failed to create bucket: {response.status_code} - {response.text}")
@@ -152,7 +207,7 @@ class APSClient:
         get_url = f"{base_endpoint}?parts={num_parts}"
         print(f"📡 GET URL: {get_url}")
         
-        get_response = requests.get(get_url, headers=headers)
+        get_response = self._request('GET', get_url, headers=headers)
         
         print(f"📡 GET Response status: {get_response.status_code}")
         print(f"📄 GET Response text: {get_response.text}")
@@ -182,7 +237,7 @@ class APSClient:
             upload_url = upload_urls[0]
             
             with open(file_path, 'rb') as f:
-                upload_response = requests.put(upload_url, data=f)
+                upload_response = self._request('PUT', upload_url, data=f)
             
             if upload_response.status_code not in [200, 201]:
                 raise Exception(f"S3 upload failed: {upload_response.status_code} - {upload_response.text}")
@@ -208,7 +263,8 @@ class APSClient:
                     
                     print(f"   Uploading part {part_number}/{len(upload_urls)} ({len(chunk_data):,} bytes)")
                     
-                    upload_response = requests.put(upload_url, data=chunk_data)
+                    with tracer.span('s3.upload_part', part=part_number, bytes=len(chunk_data)):
+                        upload_response = self._request('PUT', upload_url, data=chunk_data)
                     
                     if upload_response.status_code not in [200, 201]:
                         raise Exception(f"S3 part {part_number} upload failed: {upload_response.status_code}")
@@ -225,7 +281,7 @@ class APSClient:
         
         print(f"📋 Completion request: {json.dumps(complete_request, indent=2)}")
         
-        complete_response = requests.post(base_endpoint, headers=headers, json=complete_request)
+        complete_response = self._request('POST', base_endpoint, headers=headers, json=complete_request)
         
         print(f"📡 Completion response status: {complete_response.status_code}")
         print(f"📄 Completion response: {complete_response.text}")
@@ -254,7 +310,7 @@ class APSClient:
         max_retries = 5
         for attempt in range(max_retries):
             try:
-                response = requests.get(url, headers=headers)
+                response = self._request('GET', url, headers=headers)
                 if response.status_code == 200:
                     details = response.json()
                     actual_size = details.get('size', 0)
@@ -296,7 +352,8 @@ class APSClient:
         token = self.get_access_token()
         headers = {
             'Authorization': f'Bearer {token}',
-            'Content-Type': 'application/json'
+            'Content-Type': 'application/json',
+            **self._region_headers()
         }
         url = f"{self.base_url}/modelderivative/v2/designdata/job"
         
@@ -310,10 +367,10 @@ class APSClient:
             }
         }
         
-        print(f"🔄 Starting SVF translation for URN: {urn}")
+        print(f"🔄 Starting SVF translation for URN: {urn} (region {self.region})")
         
         try:
-            response = requests.post(url, headers=headers, json=data)
+            response = self._request('POST', url, headers=headers, json=data)
             print(f"📡 Translation response status: {response.status_code}")
             
             if response.status_code == 409:
@@ -339,11 +396,11 @@ class APSClient:
     def get_translation_status(self, urn: str):
         """Get translation status with enhanced error reporting"""
         token = self.get_access_token()
-        headers = {'Authorization': f'Bearer {token}'}
+        headers = {'Authorization': f'Bearer {token}', **self._region_headers()}
         url = f"{self.base_url}/modelderivative/v2/designdata/{urn}/manifest"
         
         try:
-            response = requests.get(url, headers=headers)
+            response = self._request('GET', url, headers=headers)
             response.raise_for_status()
             manifest = response.json()
             
@@ -402,8 +459,10 @@ class APSClient:
         
         while time.time() - start_time < timeout:
             try:
-                status_info = self.get_translation_status(urn)
-                status = status_info['status']
+                with tracer.span('aps.poll_manifest', urn=urn) as span:
+                    status_info = self.get_translation_status(urn)
+                    status = status_info['status']
+                    span.set_attribute('translation.status', status)
                 
                 # Only print status updates when they change
                 if status != last_status:
@@ -547,9 +606,89 @@ class APSClient:
                 'derivatives': []
             }
 
+    def get_manifest(self, urn: str) -> Dict[str, Any]:
+        """Fetch the raw Model Derivative manifest for a URN"""
+        token = self.get_access_token()
+        headers = {'Authorization': f'Bearer {token}', **self._region_headers()}
+        url = f"{self.base_url}/modelderivative/v2/designdata/{urn}/manifest"
+        response = self._request('GET', url, headers=headers)
+        response.raise_for_status()
+        with hot_path('json.manifest'):
+            return response.json()
+
+    def download_derivative(self, urn: str, derivative_urn: str) -> bytes:
+        """Download a single derivative file (SVF, pack file, property DB, ...)"""
+        token = self.get_access_token()
+        headers = {'Authorization': f'Bearer {token}', **self._region_headers()}
+        url = f"{self.base_url}/modelderivative/v2/designdata/{urn}/manifest/{quote(derivative_urn, safe='')}"
+        response = self._request('GET', url, headers=headers)
+        if response.status_code != 200:
+            raise Exception(f"Failed to download derivative {derivative_urn}: {response.status_code}")
+        return response.content
+
+    def download_derivative_to(self, urn: str, derivative_urn: str, path: str, chunk_size: int = 1024 * 1024) -> int:
+        """Stream a derivative file to disk, resuming from a partial file if one exists"""
+        token = self.get_access_token()
+        headers = {'Authorization': f'Bearer {token}', **self._region_headers()}
+        existing = os.path.getsize(path) if os.path.exists(path) else 0
+        if existing:
+            headers['Range'] = f'bytes={existing}-'
+
+        url = f"{self.base_url}/modelderivative/v2/designdata/{urn}/manifest/{quote(derivative_urn, safe='')}"
+        response = self._request('GET', url, headers=headers, stream=True)
+        if response.status_code == 416:
+            # Range starts at the end of the file: it was already complete
+            return existing
+        if response.status_code not in (200, 206):
+            raise Exception(f"Failed to download derivative {derivative_urn}: {response.status_code}")
+
+        # A 200 means the server ignored the range, so start over
+        mode = 'ab' if response.status_code == 206 else 'wb'
+        written = existing if mode == 'ab' else 0
+        with open(path, mode) as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+                written += len(chunk)
+        return written
+
+    def get_thumbnail(self, urn: str, size: int = 200) -> bytes:
+        """Download the PNG thumbnail of a translated model (size: 100, 200 or 400)"""
+        token = self.get_access_token()
+        headers = {'Authorization': f'Bearer {token}', **self._region_headers()}
+        url = f"{self.base_url}/modelderivative/v2/designdata/{urn}/thumbnail"
+        response = self._request('GET', url, headers=headers, params={'width': size, 'height': size})
+        if response.status_code != 200:
+            raise Exception(f"Failed to download thumbnail: {response.status_code}")
+        return response.content
+
+    def get_svf_assets(self, urn: str) -> Dict[str, Any]:
+        """Locate the primary SVF of a URN and return its resolved asset URNs"""
+        manifest = self.get_manifest(urn)
+        svf_urns = svf_reader.find_svf_urns(manifest)
+        if not svf_urns:
+            raise Exception("No SVF derivative found in manifest")
+
+        svf_urn = svf_urns[0]
+        assets = svf_reader.read_svf_assets(self.download_derivative(urn, svf_urn))
+        for asset in assets:
+            if asset.get('URI') and not asset['URI'].startswith('embed:'):
+                asset['urn'] = svf_reader.resolve_asset_urn(svf_urn, asset['URI'])
+
+        return {'svf_urn': svf_urn, 'assets': assets, 'manifest': manifest}
+
     def get_viewer_token(self) -> str:
         """Get access token for frontend viewer"""
         return self.get_access_token()
+
+    def get_viewer_token_info(self, min_lifetime: int = VIEWER_TOKEN_MIN_LIFETIME) -> Dict[str, Any]:
+        """Get a viewer token with at least min_lifetime seconds left, plus its expiry"""
+        # Never hand the viewer a token that is about to expire; it would have to refresh right away
+        token = self.get_access_token(force_refresh=self.token_expires_at - time.time() < min_lifetime)
+        return {
+            'access_token': token,
+            'expires_in': max(int(self.token_expires_at - time.time()), 0),
+            'expires_at': int(self.token_expires_at)
+        }
     
     def test_connection(self) -> Dict[str, Any]:
         """Test APS connection and return status"""
@@ -0,0 +1,93 @@
+import os
+import threading
+from typing import List, Dict, Any, Optional
+
+from aps_client import APSClient
+
+
+def load_credentials() -> List[Dict[str, Any]]:
+    """Read app credentials from the environment
+
+    The primary app uses APS_CLIENT_ID / APS_CLIENT_SECRET / APS_BUCKET_KEY.
+    Additional apps are numbered from 2: APS_CLIENT_ID_2, APS_CLIENT_SECRET_2,
+    APS_BUCKET_KEY_2 (default: <APS_BUCKET_KEY>-2) and optional APS_WEIGHT_2.
+    """
+    base_bucket = os.getenv('APS_BUCKET_KEY', 'enhanced-revit-viewer-v3')
+    credentials = [{
+        'name': 'default',
+        'client_id': os.getenv('APS_CLIENT_ID'),
+        'client_secret': os.getenv('APS_CLIENT_SECRET'),
+        'bucket_key': base_bucket,
+        'weight': float(os.getenv('APS_WEIGHT', '1'))
+    }]
+    index = 2
+    while os.getenv(f'APS_CLIENT_ID_{index}'):
+        credentials.append({
+            'name': f'app{index}',
+            'client_id': os.getenv(f'APS_CLIENT_ID_{index}'),
+            'client_secret': os.getenv(f'APS_CLIENT_SECRET_{index}'),
+            'bucket_key': os.getenv(f'APS_BUCKET_KEY_{index}', f"{base_bucket}-{index}"),
+            'weight': float(os.getenv(f'APS_WEIGHT_{index}', '1'))
+        })
+        index += 1
+    return credentials
+
+
+class CredentialPool:
+    """Spreads jobs over several APS apps, each with its own token cache and throttle state"""
+
+    def __init__(self, clients: List[APSClient], weights: Optional[List[float]] = None):
+        if not clients:
+            raise ValueError("Credential pool needs at least one client")
+        self.clients = {client.name: client for client in clients}
+        self.weights = {client.name: max(w, 0.01) for client, w in zip(clients, weights or [1.0] * len(clients))}
+        self.active = {client.name: 0 for client in clients}
+        self.completed = {client.name: 0 for client in clients}
+        self._lock = threading.Lock()
+
+    @property
+    def default(self) -> APSClient:
+        return next(iter(self.clients.values()))
+
+    def get(self, name: Optional[str]) -> APSClient:
+        """Client that owns a job; a job never moves to another credential once it has a URN"""
+        return self.clients.get(name) or self.default
+
+    def acquire(self) -> APSClient:
+        """Least-loaded available credential (active jobs / weight), checked with a token fetch"""
+        tried = set()
+        while True:
+            with self._lock:
+                candidates = [c for c in self.clients.values() if c.available and c.name not in tried]
+                if not candidates:
+                    raise Exception("No APS credential available (all throttled or rejected)")
+                client = min(candidates, key=lambda c: self.active[c.name] / self.weights[c.name])
+                self.active[client.name] += 1
+
+            try:
+                client.get_access_token()
+                return client
+            except Exception as e:
+                print(f"⚠️ Credential '{client.name}' unavailable, failing over: {e}")
+                tried.add(client.name)
+                self.release(client, completed=False)
+
+    def release(self, client: APSClient, completed: bool = True):
+        with self._lock:
+            self.active[client.name] = max(self.active[client.name] - 1, 0)
+            if completed:
+                self.completed[client.name] += 1
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            name: {
+                'bucket_key': client.bucket_key,
+                'weight': self.weights[name],
+                'active_jobs': self.active[name],
+                'completed_jobs': self.completed[name],
+                'available': client.available,
+                'revoked': client.revoked,
+                'throttled_until': client.throttled_until or None
+            }
+            for name, client in self.clients.items()
+        }
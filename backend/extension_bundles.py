@@ -0,0 +1,147 @@
+import os
+import re
+import gzip
+import json
+import hashlib
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional precompression
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:  # pragma: no cover - pinned in requirements.txt
+    rjsmin = None
+    print("⚠️ rjsmin not installed: extension bundles will not be minified")
+
+from responses import choose_encoding
+
+DEFAULT_EXTENSIONS_DIR = Path(__file__).resolve().parent.parent / 'frontend' / 'public' / 'extensions'
+EXTENSIONS_DIR = Path(os.getenv('EXTENSIONS_DIR', str(DEFAULT_EXTENSIONS_DIR)))
+BUNDLE_URL_PREFIX = '/api/extensions/bundles/'
+
+_CSS_STRING = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')')
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+
+
+def minify_css(css: str) -> str:
+    """Drop comments and redundant whitespace, leaving quoted strings untouched"""
+    css = _CSS_COMMENT.sub('', css)
+    parts = _CSS_STRING.split(css)
+    for i in range(0, len(parts), 2):
+        chunk = re.sub(r'\s+', ' ', parts[i])
+        parts[i] = re.sub(r'\s*([{};,>])\s*', r'\1', chunk)
+    return ''.join(parts).replace(';}', '}').strip()
+
+
+def minify_js(js: str) -> str:
+    """Minify with rjsmin; if it is missing the source ships as-is"""
+    if rjsmin is not None:
+        return rjsmin.jsmin(js)
+    return js
+
+
+class Bundle:
+    def __init__(self, name: str, content: bytes):
+        self.name = name
+        self.hash = hashlib.sha256(content).hexdigest()[:16]
+        self.filename = f"{name}.{self.hash}.js"
+        self.encodings = {'identity': content, 'gzip': gzip.compress(content, compresslevel=9)}
+        if brotli is not None:
+            self.encodings['br'] = brotli.compress(content, quality=11)
+
+    @property
+    def url(self) -> str:
+        return BUNDLE_URL_PREFIX + self.filename
+
+    def body_for(self, accept_encoding: str):
+        """Best precompressed body for an Accept-Encoding header: (encoding, bytes)"""
+        available = [e for e in ('br', 'gzip') if e in self.encodings]
+        encoding = choose_encoding(accept_encoding, available)
+        if encoding is None:
+            return None, self.encodings['identity']
+        return encoding, self.encodings[encoding]
+
+
+class ExtensionBundler:
+    """Builds one content-hashed bundle per extension listed in extensions/config.json"""
+
+    def __init__(self, extensions_dir: Path = EXTENSIONS_DIR):
+        self.extensions_dir = extensions_dir
+        self.bundles: Dict[str, Bundle] = {}
+        self.manifest: Dict[str, Any] = {'Extensions': []}
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def _source_files(self, config: Dict[str, Any]) -> List[Path]:
+        files = [self.extensions_dir / 'config.json']
+        for extension in config.get('Extensions', []):
+            contents = self.extensions_dir / extension['name'] / 'contents'
+            to_load = extension.get('filestoload', {})
+            files += [contents / f for f in to_load.get('cssfiles', []) + to_load.get('jsfiles', [])]
+        return files
+
+    def _current_signature(self):
+        config_path = self.extensions_dir / 'config.json'
+        if not config_path.exists():
+            return None
+        config = json.loads(config_path.read_text(encoding='utf-8'))
+        return tuple((str(p), p.stat().st_mtime_ns) for p in self._source_files(config) if p.exists())
+
+    def _build_bundle(self, extension: Dict[str, Any]) -> Bundle:
+        contents = self.extensions_dir / extension['name'] / 'contents'
+        to_load = extension.get('filestoload', {})
+        css = '\n'.join((contents / f).read_text(encoding='utf-8') for f in to_load.get('cssfiles', []))
+        js = '\n;\n'.join((contents / f).read_text(encoding='utf-8') for f in to_load.get('jsfiles', []))
+
+        parts = []
+        if css.strip():
+            # Styles ride along in the script so an extension costs a single request
+            parts.append(
+                "(function(){var s=document.createElement('style');"
+                f"s.setAttribute('data-extension',{json.dumps(extension['name'])});"
+                f"s.textContent={json.dumps(minify_css(css))};"
+                "document.head.appendChild(s);})();"
+            )
+        parts.append(minify_js(js))
+        return Bundle(extension['name'], '\n'.join(parts).encode('utf-8'))
+
+    def refresh(self) -> Dict[str, Any]:
+        """Rebuild bundles if config.json or any extension source changed"""
+        signature = self._current_signature()
+        if signature == self._signature:
+            return self.manifest
+
+        with self._lock:
+            if signature == self._signature:
+                return self.manifest
+            if signature is None:
+                self.bundles, self.manifest = {}, {'Extensions': []}
+            else:
+                config = json.loads((self.extensions_dir / 'config.json').read_text(encoding='utf-8'))
+                bundles = {}
+                for extension in config.get('Extensions', []):
+                    bundle = self._build_bundle(extension)
+                    bundles[bundle.filename] = bundle
+                    extension['bundle'] = bundle.url
+                    extension['hash'] = bundle.hash
+                config['version'] = hashlib.sha256(
+                    ''.join(sorted(bundles)).encode('utf-8')
+                ).hexdigest()[:16]
+                self.bundles, self.manifest = bundles, config
+                print(f"📦 Built {len(bundles)} extension bundle(s) from {self.extensions_dir}")
+            self._signature = signature
+        return self.manifest
+
+    def get_bundle(self, filename: str) -> Optional[Bundle]:
+        # Filenames are content-hashed, so a hit never needs a freshness check
+        if filename not in self.bundles:
+            self.refresh()
+        return self.bundles.get(filename)
+
+
+extension_bundler = ExtensionBundler()
@@ -0,0 +1,78 @@
+import os
+import time
+import asyncio
+from typing import Callable, Optional, Dict, Any
+
+PROBE_INTERVAL = float(os.getenv('HEALTH_PROBE_INTERVAL', '30'))
+# Readiness is withdrawn if the last successful probe is older than this
+PROBE_STALE_AFTER = float(os.getenv('HEALTH_PROBE_STALE_AFTER', str(PROBE_INTERVAL * 4)))
+
+
+class HealthMonitor:
+    """Probes APS in the background and serves health checks from the last snapshot"""
+
+    def __init__(self, client_factory: Callable[[], Any], interval: float = PROBE_INTERVAL):
+        self.client_factory = client_factory
+        self.interval = interval
+        self.started_at = time.time()
+        self.last_success_at: Optional[float] = None
+        self.snapshot: Dict[str, Any] = {
+            "status": "starting",
+            "services": {"aps_connected": False, "bucket_accessible": False},
+            "diagnostics": {},
+            "checked_at": None
+        }
+        self._task: Optional[asyncio.Task] = None
+
+    def probe(self) -> Dict[str, Any]:
+        """Run one blocking probe against APS and store the result"""
+        services = {"aps_connected": False, "bucket_accessible": False}
+        diagnostics = {}
+        started = time.perf_counter()
+
+        try:
+            client = self.client_factory()
+            token = client.get_access_token()
+            services["aps_connected"] = bool(token)
+            diagnostics["aps_token_length"] = len(token) if token else 0
+            try:
+                services["bucket_accessible"] = client.ensure_bucket_exists(force_check=True)
+            except Exception as e:
+                diagnostics["bucket_error"] = str(e)
+        except Exception as e:
+            diagnostics["aps_error"] = str(e)
+
+        diagnostics["probe_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        healthy = all(services.values())
+        now = time.time()
+        if healthy:
+            self.last_success_at = now
+
+        self.snapshot = {
+            "status": "healthy" if healthy else "unhealthy",
+            "services": services,
+            "diagnostics": diagnostics,
+            "checked_at": now
+        }
+        return self.snapshot
+
+    @property
+    def ready(self) -> bool:
+        return self.last_success_at is not None and time.time() - self.last_success_at < PROBE_STALE_AFTER
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.probe)
+            except Exception as e:
+                print(f"⚠️ Health probe error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
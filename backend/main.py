@@ -1,10 +1,18 @@
 import os
+import time
 import uuid
+import hashlib
+import hmac
+import json
+import shutil
 import asyncio
+import threading
+from itertools import islice
+from collections import OrderedDict
 from pathlib import Path
 from typing import Optional, Dict, Any
 import aiofiles
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Request
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, BackgroundTasks, Request, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse, FileResponse, Response
@@ -13,9 +21,22 @@ from dotenv import load_dotenv
 import sys
 
 from aps_client import APSClient
+from spatial_index import SpatialIndex
+from health import HealthMonitor
+from regions import RegionSettings, RegionRouter
+from credential_pool import CredentialPool, load_credentials
+from offline_export import OfflineExporter, OfflineArchive, EXPORT_DIR
+from thumbnails import thumbnail_cache, closest_size, DEFAULT_THUMBNAIL_SIZE
+from extension_bundles import extension_bundler
+from responses import FastJSONResponse, json_response, make_etag, etag_matches
+from tracing import tracer, SpanContext, TracingMiddleware
+from profiling import profiler, loop_monitor, timings, hot_path, TimingMiddleware
+from model_diff import ModelDigest, diff_digests, changed_parameters, describe_elements
+import svf_reader
+import numpy as np
 
 load_dotenv()
-app = FastAPI(title="Simple Revit Viewer API", version="1.0.0")
+app = FastAPI(title="Simple Revit Viewer API", version="1.0.0", default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -31,16 +52,143 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+# No blanket compression middleware: large JSON goes through json_response(), which
+# negotiates br/gzip itself, and files (PNGs, gzipped derivatives, archives) are sent as-is
+
+# Only installed when an exporter is configured, so untraced requests pay nothing
+if tracer.enabled:
+    app.add_middleware(TracingMiddleware, tracer=tracer)
+
+# Always installed because timings can be switched on at runtime; a no-op while they are off
+app.add_middleware(TimingMiddleware, timings=timings)
+
+# Profiling endpoints are disabled unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+def require_admin(request: Request):
+    """Allow the request only with a matching X-Admin-Token header"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not found")
+    supplied = request.headers.get('x-admin-token', '')
+    if not hmac.compare_digest(supplied.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
 # Define directories
 UPLOAD_DIR = Path(os.getenv('UPLOAD_DIR', './models/temp'))
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+INDEX_DIR = Path(os.getenv('INDEX_DIR', './models/index'))
+INDEX_DIR.mkdir(parents=True, exist_ok=True)
+
+# Region routing: each configured region has its own endpoint and bucket
+region_settings = RegionSettings()
+region_router = RegionRouter(region_settings)
+
+# APS credential pools (one per region) are created on first use so the app can
+# start without credentials or network
+_credential_pools: Dict[str, CredentialPool] = {}
+_aps_client_lock = threading.Lock()
+
+def get_credential_pool(region: Optional[str] = None) -> CredentialPool:
+    region = region or region_settings.default
+    if region not in _credential_pools:
+        with _aps_client_lock:
+            if region not in _credential_pools:
+                config = region_settings.regions[region]
+                clients, weights = [], []
+                for credential in load_credentials():
+                    if credential['name'] == 'default':
+                        bucket_key = config['bucket_key']
+                    elif region == region_settings.default:
+                        bucket_key = credential['bucket_key']
+                    else:
+                        bucket_key = f"{credential['bucket_key']}-{region.lower()}"
+                    client = APSClient(
+                        region=region, base_url=config['base_url'], bucket_key=bucket_key,
+                        client_id=credential['client_id'], client_secret=credential['client_secret'],
+                        name=credential['name']
+                    )
+                    client.latency_observer = lambda seconds, r=region: region_router.record(r, seconds)
+                    clients.append(client)
+                    weights.append(credential['weight'])
+                _credential_pools[region] = CredentialPool(clients, weights)
+    return _credential_pools[region]
+
+def get_aps_client(region: Optional[str] = None) -> APSClient:
+    """Primary credential's client for a region (health checks and non-job calls)"""
+    return get_credential_pool(region).default
+
+def get_job_client(job_id: str) -> APSClient:
+    """Client for the region and credential that own a job's object and derivatives"""
+    job_data = processing_jobs[job_id]
+    return get_credential_pool(job_data.get('region')).get(job_data.get('credential'))
+
+health_monitor = HealthMonitor(get_aps_client)
 
-# Initialize APS client
-aps_client = APSClient()
+@app.on_event("startup")
+async def start_health_monitor():
+    health_monitor.start()
+
+@app.on_event("shutdown")
+async def stop_health_monitor():
+    await health_monitor.stop()
+
+@app.on_event("startup")
+async def start_loop_monitor():
+    # LOOP_LAG_THRESHOLD_MS turns the monitor on from boot; otherwise it is started via the admin API
+    threshold_ms = os.getenv('LOOP_LAG_THRESHOLD_MS')
+    if threshold_ms:
+        loop_monitor.start(threshold=float(threshold_ms) / 1000)
+
+@app.on_event("shutdown")
+async def stop_loop_monitor():
+    await loop_monitor.stop()
 
 # In-memory job tracking
 processing_jobs: Dict[str, Dict[str, Any]] = {}
 
+# Loaded spatial indexes, keyed by job_id
+spatial_indexes: Dict[str, SpatialIndex] = {}
+
+# Open offline archives, keyed by job_id
+offline_archives: Dict[str, OfflineArchive] = {}
+
+# Catalog entries of completed models in completion order; the version bumps on every change.
+# The counter restarts with the process, so ETags also carry a per-process boot id.
+model_catalog: Dict[str, Dict[str, Any]] = {}
+catalog_version = 0
+CATALOG_BOOT_ID = uuid.uuid4().hex
+MAX_CATALOG_PAGE_SIZE = 200
+
+def thumbnail_url(job_id: str, size: int, digest: str) -> str:
+    # The digest in the query string makes each URL name exactly one image
+    return f"/api/models/{job_id}/thumbnail?size={size}&v={digest[:16]}"
+
+def update_catalog(job_id: str):
+    """(Re)build the catalog entry of a completed job so listing never touches APS"""
+    global catalog_version
+    job_data = processing_jobs.get(job_id)
+    if job_data is None:
+        # Deleted while a follow-up step was still running
+        return
+    thumbnails = job_data.get('thumbnails', {})
+    model_catalog[job_id] = {
+        'job_id': job_id,
+        'filename': job_data.get('filename', ''),
+        'urn': job_data.get('urn', ''),
+        'status': job_data.get('status', ''),
+        'created_at': job_data.get('created_at', ''),
+        'viewer_type': 'APS Viewer',
+        'thumbnail': thumbnail_url(job_id, DEFAULT_THUMBNAIL_SIZE, thumbnails[DEFAULT_THUMBNAIL_SIZE])
+        if DEFAULT_THUMBNAIL_SIZE in thumbnails else None,
+        'thumbnails': {size: thumbnail_url(job_id, size, digest) for size, digest in thumbnails.items()}
+    }
+    catalog_version += 1
+
+def remove_from_catalog(job_id: str):
+    global catalog_version
+    if model_catalog.pop(job_id, None) is not None:
+        catalog_version += 1
+
 class ProcessingStatus(BaseModel):
     job_id: str
     status: str  # 'uploading', 'translating', 'completed', 'failed'
@@ -56,52 +204,256 @@ class ModelInfo(BaseModel):
     status: str
     created_at: str
 
-async def process_file_pipeline(job_id: str, file_path: str, filename: str):
-    """Simplified pipeline - only upload and translate to SVF"""
+def build_spatial_index(job_id: str, urn: str) -> SpatialIndex:
+    """Read SVF fragment boxes for a URN and persist a spatial index"""
+    client = get_job_client(job_id)
+    svf = client.get_svf_assets(urn)
+    fragment_asset = next(
+        (a for a in svf['assets'] if a.get('type') == svf_reader.FRAGMENT_LIST_TYPE and a.get('urn')), None
+    )
+    if not fragment_asset:
+        raise Exception("No fragment list found in SVF")
+
+    dbids, boxes = svf_reader.parse_fragment_list(client.download_derivative(urn, fragment_asset['urn']))
+    dbids, boxes = svf_reader.merge_boxes_by_dbid(dbids, boxes)
+
+    external_ids = None
+    ids_asset = next(
+        (a for a in svf['assets'] if a.get('type') == svf_reader.PROPERTY_DB_TYPE
+         and a.get('urn', '').endswith('objects_ids.json.gz')), None
+    )
+    if ids_asset:
+        all_ids = svf_reader.load_json_asset(client.download_derivative(urn, ids_asset['urn']))
+        external_ids = np.array([str(all_ids[i]) if i < len(all_ids) else '' for i in dbids])
+
+    index = SpatialIndex(dbids, boxes, external_ids)
+    index.save(INDEX_DIR / f"{job_id}.npz")
+    spatial_indexes[job_id] = index
+    print(f"🧭 Spatial index built for job {job_id}: {len(index):,} elements")
+    return index
+
+def get_spatial_index(job_id: str) -> Optional[SpatialIndex]:
+    """Return the spatial index for a job, loading it from disk if needed"""
+    if job_id in spatial_indexes:
+        return spatial_indexes[job_id]
+    path = INDEX_DIR / f"{job_id}.npz"
+    if path.exists():
+        spatial_indexes[job_id] = SpatialIndex.load(path)
+        return spatial_indexes[job_id]
+    return None
+
+# Serializes downloads and digest builds per job; concurrent diffs share one job's files
+_job_locks: Dict[str, threading.RLock] = {}
+_job_locks_guard = threading.Lock()
+
+def job_lock(job_id: str) -> threading.RLock:
+    with _job_locks_guard:
+        if job_id not in _job_locks:
+            _job_locks[job_id] = threading.RLock()
+        return _job_locks[job_id]
+
+def load_property_db(job_id: str) -> svf_reader.PropertyDatabase:
+    """Parse the property database of a job's model, downloading it to INDEX_DIR only once"""
+    folder = INDEX_DIR / f"{job_id}.propdb"
+    paths = {name: folder / f"objects_{name}.json.gz" for name in svf_reader.PROPERTY_DB_FILES}
+    with job_lock(job_id):
+        if not all(path.exists() for path in paths.values()):
+            download_property_db(job_id, folder, paths)
+    files = {name: svf_reader.load_json_asset(path.read_bytes()) for name, path in paths.items()}
+    return svf_reader.PropertyDatabase(files)
+
+def download_property_db(job_id: str, folder: Path, paths: Dict[str, Path]):
+    """Fetch the property DB files of a job; call with the job's lock held"""
+    client = get_job_client(job_id)
+    urn = processing_jobs[job_id]['urn']
+    svf = client.get_svf_assets(urn)
+    folder.mkdir(parents=True, exist_ok=True)
+    for name, asset_urn in svf_reader.PropertyDatabase.find_assets(svf['assets']).items():
+        if paths[name].exists():
+            continue
+        # Only the lock holder writes .part files, so resuming one is safe
+        partial = paths[name].with_name(paths[name].name + '.part')
+        client.download_derivative_to(urn, asset_urn, str(partial))
+        partial.replace(paths[name])
+
+def get_cached_svf_info(job_id: str) -> Dict[str, Any]:
+    """SVF derivative info for a completed job; the manifest is final, so it is fetched once"""
+    job_data = processing_jobs[job_id]
+    if 'svf_info' not in job_data:
+        svf_info = get_job_client(job_id).get_svf_derivative_info(job_data['urn'])
+        if not svf_info['success']:
+            return svf_info
+        job_data['manifest_version'] = hashlib.sha256(
+            json.dumps(svf_info['manifest'], sort_keys=True).encode()
+        ).hexdigest()[:16]
+        job_data['svf_info'] = svf_info
+    return job_data['svf_info']
+
+def get_model_digest(job_id: str) -> ModelDigest:
+    """Return per-element hashes for a job, computing and caching them on first use"""
+    path = INDEX_DIR / f"{job_id}.digest.npz"
+    with job_lock(job_id):
+        if path.exists():
+            digest = ModelDigest.load(path)
+            if digest is not None:
+                return digest
+
+        db = load_property_db(job_id)
+        digest = ModelDigest.from_property_db(db, get_spatial_index(job_id))
+        digest.save(path)
+    print(f"🔢 Digest built for job {job_id}: {len(digest.external_ids):,} elements")
+    return digest
+
+def run_offline_export(job_id: str):
+    """Export all derivatives of a job into an offline archive (runs in a worker thread)"""
+    job_data = processing_jobs[job_id]
+    progress = job_data['export']
+    # A previous archive is about to be replaced; it is reopened once the new one is complete
+    stale = offline_archives.pop(job_id, None)
+    if stale:
+        stale.close()
     try:
-        processing_jobs[job_id].update({
-            'status': 'uploading',
-            'progress': 10,
-            'message': 'Uploading file to APS...'
-        })
+        exporter = OfflineExporter(get_job_client(job_id), job_id, job_data['urn'], progress=progress)
+        with tracer.span('offline_export', job_id=job_id):
+            exporter.run()
+    except Exception as e:
+        progress.update({'status': 'failed', 'error': str(e)})
+        print(f"❌ Offline export failed for job {job_id}: {e}")
 
-        object_key = f"{job_id}_{filename}"
-        urn = aps_client.upload_file(file_path, object_key)
-        processing_jobs[job_id]['urn'] = urn
-        
-        processing_jobs[job_id].update({
-            'status': 'translating',
-            'progress': 50,
-            'message': 'Translating model to SVF format...'
-        })
-        
-        # Start translation
-        aps_client.translate_to_svf(urn)
-        
-        # Wait for translation to complete
-        translation_result = aps_client.wait_for_translation(urn)
-        if translation_result['status'] != 'success':
-            raise Exception(f"Translation failed: {translation_result}")
-        
-        # Update status: completed
-        processing_jobs[job_id].update({
-            'status': 'completed',
-            'progress': 100,
-            'message': 'SVF model ready for viewing',
-        })
-        
-        # Clean up upload file
-        if os.path.exists(file_path):
-            os.remove(file_path)
+def get_offline_archive(job_id: str) -> Optional[OfflineArchive]:
+    if job_id not in processing_jobs:
+        return None
+    if job_id not in offline_archives:
+        export = processing_jobs.get(job_id, {}).get('export', {})
+        if export.get('status') != 'completed' or 'archive' not in export:
+            return None
+        offline_archives[job_id] = OfflineArchive(Path(export['archive']))
+    return offline_archives[job_id]
+
+def delete_job_data(job_id: str):
+    """Drop a deleted job's cached state and files under INDEX_DIR and EXPORT_DIR (blocking)"""
+    archive = offline_archives.pop(job_id, None)
+    if archive:
+        archive.close()
+    spatial_indexes.pop(job_id, None)
+    with diff_results_lock:
+        for key in [k for k in diff_results if job_id in k[:2]]:
+            del diff_results[key]
+
+    # Wait for any property DB download or digest build on this job to finish first
+    with job_lock(job_id):
+        # <job_id>.npz, <job_id>.digest.npz and the <job_id>.propdb folder
+        for path in INDEX_DIR.glob(f"{job_id}.*"):
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+        shutil.rmtree(EXPORT_DIR / job_id, ignore_errors=True)
+    with _job_locks_guard:
+        _job_locks.pop(job_id, None)
+    print(f"🗑️ Removed cached data for job {job_id}")
+
+def process_file_pipeline(job_id: str, file_path: str, filename: str, trace_parent: Optional[SpanContext] = None,
+                          region: Optional[str] = None, tenant: Optional[str] = None):
+    """Simplified pipeline - only upload and translate to SVF
+
+    Every stage blocks (HTTP, polling, file I/O), so this is a plain function:
+    BackgroundTasks runs it in the threadpool and jobs proceed side by side.
+    The request's trace context is handed over explicitly as trace_parent.
+    """
+    with tracer.span('pipeline', parent=trace_parent, job_id=job_id, filename=filename) as pipeline_span:
+        pool, client = None, None
+        try:
+            processing_jobs[job_id].update({
+                'status': 'uploading',
+                'progress': 10,
+                'message': 'Uploading file to APS...'
+            })
+
+            # Route to the requested, tenant or lowest-latency region
+            region = region_router.choose(region, tenant)
+            processing_jobs[job_id]['region'] = region
+            pipeline_span.set_attribute('aps.region', region)
+            pool = get_credential_pool(region)
+            client = pool.acquire()
+            processing_jobs[job_id]['credential'] = client.name
+            pipeline_span.set_attribute('aps.credential', client.name)
+
+            object_key = f"{job_id}_{filename}"
+            with tracer.span('pipeline.upload'):
+                urn = client.upload_file(file_path, object_key)
+            processing_jobs[job_id]['urn'] = urn
             
-    except Exception as e:
-        processing_jobs[job_id].update({
-            'status': 'failed',
-            'progress': 0,
-            'message': str(e),
-            'error': str(e)
-        })
-        print(f"Processing failed for job {job_id}: {str(e)}")
+            processing_jobs[job_id].update({
+                'status': 'translating',
+                'progress': 50,
+                'message': 'Translating model to SVF format...'
+            })
+            
+            # Start translation
+            with tracer.span('pipeline.translate', urn=urn):
+                client.translate_to_svf(urn)
+            
+            # Wait for translation to complete
+            with tracer.span('pipeline.wait_for_translation', urn=urn):
+                translation_result = client.wait_for_translation(urn)
+            if translation_result['status'] != 'success':
+                raise Exception(f"Translation failed: {translation_result}")
+            # The manifest is final once translation succeeds, so keep what the viewer needs
+            processing_jobs[job_id]['viewables'] = svf_reader.get_viewables(translation_result['manifest'])
+            
+            # Update status: completed; thumbnails and the spatial index follow without holding up viewing
+            processing_jobs[job_id].update({
+                'status': 'completed',
+                'progress': 100,
+                'message': 'SVF model ready for viewing',
+                'spatial_index': 'building'
+            })
+            update_catalog(job_id)
+            
+            # Clean up upload file
+            if os.path.exists(file_path):
+                os.remove(file_path)
+                
+        except Exception as e:
+            pipeline_span.record_error(e)
+            processing_jobs[job_id].update({
+                'status': 'failed',
+                'progress': 0,
+                'message': str(e),
+                'error': str(e)
+            })
+            print(f"Processing failed for job {job_id}: {str(e)}")
+        finally:
+            if client is not None:
+                pool.release(client, completed=processing_jobs[job_id]['status'] == 'completed')
+
+        if processing_jobs[job_id]['status'] == 'completed':
+            build_derived_data(job_id)
+
+def build_derived_data(job_id: str):
+    """Follow-up steps after a job is viewable: cached thumbnails, then the spatial index"""
+    job_data = processing_jobs[job_id]
+    urn = job_data['urn']
+
+    # Cache thumbnails so the catalog never has to ask APS for them
+    with tracer.span('pipeline.thumbnails') as span:
+        try:
+            job_data['thumbnails'] = thumbnail_cache.fetch_all(get_job_client(job_id), urn)
+            update_catalog(job_id)
+        except Exception as e:
+            span.record_error(e)
+            print(f"⚠️ Thumbnails failed for job {job_id}: {e}")
+
+    # Build spatial index; a failure here only disables spatial queries
+    with tracer.span('pipeline.spatial_index') as span:
+        try:
+            build_spatial_index(job_id, urn)
+            job_data['spatial_index'] = 'ready'
+        except Exception as e:
+            span.record_error(e)
+            job_data['spatial_index'] = 'failed'
+            print(f"⚠️ Spatial index failed for job {job_id}: {e}")
 
 @app.get("/")
 async def root():
@@ -119,45 +471,141 @@ async def root():
 
 @app.get("/api/health")
 async def health_check():
-    """Health check with APS diagnostics"""
-    health_data = {
-        "status": "healthy",
-        "services": {},
+    """Health summary from the last background probe (no APS calls per request)"""
+    snapshot = health_monitor.snapshot
+    return {
+        "status": snapshot["status"],
+        "services": snapshot["services"],
         "viewer": "APS Viewer only",
         "version": "1.0.0",
-        "diagnostics": {}
+        "diagnostics": snapshot["diagnostics"],
+        "checked_at": snapshot["checked_at"]
     }
-    
+
+@app.get("/api/health/live")
+async def liveness():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "alive", "uptime": round(time.time() - health_monitor.started_at, 1)}
+
+@app.get("/api/health/ready")
+async def readiness():
+    """Readiness: APS and the bucket were reachable on a recent probe"""
+    snapshot = health_monitor.snapshot
+    body = {
+        "status": "ready" if health_monitor.ready else "not_ready",
+        "services": snapshot["services"],
+        "checked_at": snapshot["checked_at"]
+    }
+    return JSONResponse(body, status_code=200 if health_monitor.ready else 503)
+
+@app.get("/api/regions", dependencies=[Depends(require_admin)])
+async def list_regions():
+    """Configured APS regions with their measured latency"""
+    return {
+        'default': region_settings.default,
+        'latency_routing': region_settings.latency_routing,
+        'tenants': region_settings.tenants,
+        'regions': region_router.report()
+    }
+
+@app.get("/api/credentials", dependencies=[Depends(require_admin)])
+async def list_credentials():
+    """Load and throttle state of each APS credential, per region (no secrets)"""
+    return {region: pool.report() for region, pool in _credential_pools.items()}
+
+@app.post("/api/admin/profile/start", dependencies=[Depends(require_admin)])
+async def start_profiler(seconds: float = 30, interval_ms: float = 5):
+    """Sample every thread's stack for N seconds"""
+    if seconds <= 0:
+        raise HTTPException(status_code=400, detail="seconds must be positive")
     try:
-        # Test APS connection
-        try:
-            token = aps_client.get_access_token()
-            aps_connected = bool(token)
-            health_data["diagnostics"]["aps_token_length"] = len(token) if token else 0
-        except Exception as e:
-            aps_connected = False
-            health_data["diagnostics"]["aps_error"] = str(e)
-        
-        health_data["services"]["aps_connected"] = aps_connected
-        
-        # Test bucket access
-        try:
-            bucket_accessible = aps_client.ensure_bucket_exists()
-            health_data["services"]["bucket_accessible"] = bucket_accessible
-        except Exception as e:
-            health_data["services"]["bucket_accessible"] = False
-            health_data["diagnostics"]["bucket_error"] = str(e)
-        
+        profiler.start(seconds, interval=interval_ms / 1000)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return profiler.status()
+
+@app.post("/api/admin/profile/stop", dependencies=[Depends(require_admin)])
+async def stop_profiler():
+    await asyncio.to_thread(profiler.stop)
+    return profiler.status()
+
+@app.get("/api/admin/profile", dependencies=[Depends(require_admin)])
+async def get_profiler_status():
+    return profiler.status()
+
+@app.get("/api/admin/profile/flamegraph", dependencies=[Depends(require_admin)])
+async def download_flamegraph():
+    """Collapsed stacks of the last session, for flamegraph.pl or speedscope"""
+    if profiler.running:
+        raise HTTPException(status_code=409, detail="Profiler is still running")
+    return Response(content=profiler.collapsed(), media_type='text/plain', headers={
+        'Content-Disposition': f'attachment; filename="profile-{int(profiler.started_at or 0)}.folded"'
+    })
+
+@app.post("/api/admin/loop-monitor/start", dependencies=[Depends(require_admin)])
+async def start_loop_lag_monitor(threshold_ms: float = 100):
+    """Record stacks of callbacks that block the event loop longer than threshold_ms"""
+    loop_monitor.start(threshold=threshold_ms / 1000)
+    return loop_monitor.status()
+
+@app.post("/api/admin/loop-monitor/stop", dependencies=[Depends(require_admin)])
+async def stop_loop_lag_monitor():
+    await loop_monitor.stop()
+    return loop_monitor.status()
+
+@app.get("/api/admin/loop-monitor", dependencies=[Depends(require_admin)])
+async def get_loop_lag_monitor():
+    return loop_monitor.status()
+
+@app.post("/api/admin/timings/start", dependencies=[Depends(require_admin)])
+async def start_timings(reset: bool = True):
+    """Start recording per-endpoint and hot-path timings"""
+    if reset:
+        timings.reset()
+    timings.enabled = True
+    return {'enabled': True}
+
+@app.post("/api/admin/timings/stop", dependencies=[Depends(require_admin)])
+async def stop_timings():
+    timings.enabled = False
+    return {'enabled': False}
+
+@app.get("/api/admin/timings", dependencies=[Depends(require_admin)])
+async def get_timings():
+    return {'enabled': timings.enabled, 'timings': timings.report()}
+
+@app.get("/api/extensions/manifest")
+async def extensions_manifest(request: Request):
+    """Extension config with the hashed bundle URL of each extension"""
+    try:
+        manifest = extension_bundler.refresh()
     except Exception as e:
-        health_data["status"] = "unhealthy"
-        health_data["error"] = str(e)
-    
-    return health_data
+        raise HTTPException(status_code=500, detail=f"Failed to build extension bundles: {str(e)}")
+    return json_response(request, manifest, etag=make_etag('extensions', manifest.get('version', '')))
+
+@app.get("/api/extensions/bundles/{filename}")
+async def extension_bundle(filename: str, request: Request):
+    """Serve a precompressed extension bundle; names are content-hashed, so cache forever"""
+    bundle = extension_bundler.get_bundle(filename)
+    if bundle is None:
+        raise HTTPException(status_code=404, detail="Bundle not found")
+
+    encoding, body = bundle.body_for(request.headers.get('accept-encoding', ''))
+    headers = {
+        'Cache-Control': 'public, max-age=31536000, immutable',
+        'ETag': f'"{bundle.hash}"',
+        'Vary': 'Accept-Encoding'
+    }
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(content=body, media_type='application/javascript', headers=headers)
 
 @app.post("/api/upload")
 async def upload_file(
     background_tasks: BackgroundTasks,
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    region: Optional[str] = Form(None),
+    tenant: Optional[str] = Form(None)
 ):
     """Upload file and start processing pipeline"""
     try:
@@ -165,8 +613,12 @@ async def upload_file(
         if not file.filename:
             raise HTTPException(status_code=400, detail="No filename provided")
         
+        if region and region.upper() not in region_settings.regions:
+            raise HTTPException(status_code=400, detail=f"Region not configured: {region}")
+        
         # Basic file validation
-        content = await file.read()
+        with hot_path('upload.read'):
+            content = await file.read()
         file_size = len(content)
         
         if file_size == 0:
@@ -177,8 +629,9 @@ async def upload_file(
         
         # Save file temporarily
         file_path = UPLOAD_DIR / f"{job_id}_{file.filename}"
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(content)
+        with hot_path('upload.write'):
+            async with aiofiles.open(file_path, 'wb') as f:
+                await f.write(content)
         
         # Initialize job tracking
         processing_jobs[job_id] = {
@@ -190,8 +643,14 @@ async def upload_file(
             'created_at': str(asyncio.get_event_loop().time())
         }
         
-        # Start background processing
-        background_tasks.add_task(process_file_pipeline, job_id, str(file_path), file.filename)
+        # Start background processing, linked to this request's trace
+        trace_parent = tracer.current_context()
+        if trace_parent:
+            trace_parent.attributes['job_id'] = job_id
+            processing_jobs[job_id]['trace_id'] = trace_parent.trace_id
+        background_tasks.add_task(
+            process_file_pipeline, job_id, str(file_path), file.filename, trace_parent, region, tenant
+        )
         
         return {
             "job_id": job_id,
@@ -225,13 +684,67 @@ async def get_viewer_token(job_id: str):
         raise HTTPException(status_code=400, detail="Model not ready for viewing")
     
     try:
-        token = aps_client.get_viewer_token()
-        return {"token": token}
+        token_info = await asyncio.to_thread(get_job_client(job_id).get_viewer_token_info)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get viewer token: {str(e)}")
+    # Used by the viewer to refresh its token, so it must never come from a cache
+    return JSONResponse({
+        "token": token_info['access_token'],
+        "expires_in": token_info['expires_in'],
+        "expires_at": token_info['expires_at']
+    }, headers={'Cache-Control': 'no-store'})
+
+@app.get("/api/models/{job_id}/open")
+async def open_model(job_id: str, request: Request):
+    """Everything the viewer needs to open a model, in one round trip"""
+    if job_id not in processing_jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    job_data = processing_jobs[job_id]
+    if job_data['status'] != 'completed':
+        raise HTTPException(status_code=400, detail="Model not ready for viewing")
+    
+    urn = job_data.get('urn')
+    if not urn:
+        raise HTTPException(status_code=400, detail="No URN available for model")
+    
+    try:
+        client = get_job_client(job_id)
+        if 'viewables' not in job_data:
+            manifest = await asyncio.to_thread(client.get_manifest, urn)
+            job_data['viewables'] = svf_reader.get_viewables(manifest)
+        token_info = await asyncio.to_thread(client.get_viewer_token_info)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to open model: {str(e)}")
+    
+    # The token is part of the ETag so a rotated token is never served from a stale 304.
+    # The body carries the absolute expiry (fixed per token), not a countdown a 304 would freeze.
+    etag = make_etag(job_id, urn, token_info['access_token'], len(job_data['viewables']))
+    
+    viewables = job_data['viewables']
+    return json_response(request, {
+        'job_id': job_id,
+        'urn': urn,
+        'region': job_data.get('region', region_settings.default),
+        'viewer_api': region_settings.regions.get(
+            job_data.get('region', region_settings.default), {}
+        ).get('viewer_api', 'derivativeV2'),
+        'document_id': f"urn:{urn}",
+        'token': token_info['access_token'],
+        'expires_at': token_info['expires_at'],
+        'default_viewable': viewables[0] if viewables else None,
+        'viewables': viewables,
+        'model': {
+            'filename': job_data.get('filename', ''),
+            'status': job_data.get('status', ''),
+            'created_at': job_data.get('created_at', ''),
+            'spatial_index': job_data.get('spatial_index'),
+            'viewer_type': 'APS Viewer'
+        }
+    }, etag=etag, cache_control='private, no-cache')
 
 @app.get("/api/models/{job_id}/verify-svf")
-async def verify_svf_access(job_id: str):
+async def verify_svf_access(job_id: str, request: Request):
     """Verify SVF derivative is accessible from server side"""
     if job_id not in processing_jobs:
         raise HTTPException(status_code=404, detail="Job not found")
@@ -246,7 +759,7 @@ async def verify_svf_access(job_id: str):
             raise HTTPException(status_code=400, detail="No URN available for model")
         
         # Get SVF derivative info
-        svf_info = aps_client.get_svf_derivative_info(urn)
+        svf_info = get_cached_svf_info(job_id)
         
         if not svf_info['success']:
             return {
@@ -257,7 +770,7 @@ async def verify_svf_access(job_id: str):
         
         # Test SVF URL accessibility from server
         svf_url = svf_info['primary_svf_url']
-        token = aps_client.get_access_token()
+        token = get_job_client(job_id).get_access_token()
         
         headers = {
             'Authorization': f'Bearer {token}',
@@ -277,7 +790,8 @@ async def verify_svf_access(job_id: str):
             except Exception as e:
                 print(f"Could not get manifest data: {e}")
         
-        return {
+        # Body includes live response headers, so the ETag is derived from the content
+        return json_response(request, {
             'success': True,
             'svf_url': svf_url,
             'svf_accessible': response.status_code == 200,
@@ -285,7 +799,7 @@ async def verify_svf_access(job_id: str):
             'headers': dict(response.headers),
             'manifest_data': manifest_data,
             'all_derivatives': svf_info['derivatives']
-        }
+        })
         
     except Exception as e:
         return {
@@ -295,7 +809,7 @@ async def verify_svf_access(job_id: str):
         }
 
 @app.get("/api/models/{job_id}/svf-url")
-async def get_svf_url(job_id: str):
+async def get_svf_url(job_id: str, request: Request):
     """Get SVF derivative URL for loadModel()"""
     if job_id not in processing_jobs:
         raise HTTPException(status_code=404, detail="Job not found")
@@ -310,17 +824,17 @@ async def get_svf_url(job_id: str):
             raise HTTPException(status_code=400, detail="No URN available for model")
         
         # Get SVF derivative info
-        svf_info = aps_client.get_svf_derivative_info(urn)
+        svf_info = get_cached_svf_info(job_id)
         
         if not svf_info['success']:
             raise HTTPException(status_code=500, detail=f"Failed to get SVF info: {svf_info.get('error')}")
         
-        return {
+        return json_response(request, {
             'success': True,
             'primary_svf_url': svf_info['primary_svf_url'],
             'all_derivatives': svf_info['derivatives'],
             'urn': urn
-        }
+        }, etag=make_etag('svf-url', job_id, urn, job_data['manifest_version']))
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get SVF URL: {str(e)}")
@@ -342,28 +856,259 @@ async def get_model_info(job_id: str):
         'viewer_type': 'APS Viewer'
     }
 
-@app.get("/api/models")
-async def list_models():
-    """List all processed models"""
-    models = []
-    for job_id, job_data in processing_jobs.items():
-        if job_data.get('status') == 'completed':
-            models.append({
-                'job_id': job_id,
-                'filename': job_data.get('filename', ''),
-                'urn': job_data.get('urn', ''),
-                'status': job_data.get('status', ''),
-                'created_at': job_data.get('created_at', ''),
-                'viewer_type': 'APS Viewer'
-            })
+def _parse_vector(value: Optional[str], name: str):
+    if value is None:
+        raise HTTPException(status_code=400, detail=f"Missing '{name}' parameter")
+    try:
+        parts = [float(v) for v in value.split(',')]
+    except ValueError:
+        parts = []
+    if len(parts) != 3:
+        raise HTTPException(status_code=400, detail=f"'{name}' must be 'x,y,z'")
+    return parts
+
+# Upper bound on elements returned by one spatial query
+MAX_SPATIAL_RESULTS = 10000
+
+@app.get("/api/models/{job_id}/spatial")
+async def spatial_query(
+    request: Request,
+    job_id: str,
+    query: str = 'box',
+    min_corner: Optional[str] = Query(None, alias='min'),
+    max_corner: Optional[str] = Query(None, alias='max'),
+    point: Optional[str] = None,
+    n: int = 10,
+    room: Optional[int] = None,
+    limit: int = 1000
+):
+    """Spatial queries over element bounding boxes: box, point, nearest or room"""
+    limit = min(max(limit, 1), MAX_SPATIAL_RESULTS)
+    if job_id not in processing_jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    index = get_spatial_index(job_id)
+    if index is None:
+        if processing_jobs[job_id].get('spatial_index') == 'building':
+            raise HTTPException(status_code=503, detail="Spatial index is still building")
+        raise HTTPException(status_code=400, detail="Spatial index not available for model")
+
+    if query == 'box':
+        leaves = index.query_box(_parse_vector(min_corner, 'min'), _parse_vector(max_corner, 'max'))
+    elif query == 'point':
+        leaves = index.query_point(_parse_vector(point, 'point'))
+    elif query == 'nearest':
+        # The nearest search walks the tree through a Python heap, so it is bounded like any listing
+        nearest = index.query_nearest(_parse_vector(point, 'point'), min(max(n, 1), limit))
+        elements = index.describe(leaf for leaf, _ in nearest)
+        for element, (_, distance) in zip(elements, nearest):
+            element['distance'] = distance
+        return json_response(request, {'query': query, 'count': len(elements), 'elements': elements})
+    elif query == 'room':
+        if room is None:
+            raise HTTPException(status_code=400, detail="Missing 'room' parameter")
+        room_leaf = index.leaf_for_dbid(room)
+        if room_leaf is None:
+            raise HTTPException(status_code=404, detail="Room not found in spatial index")
+        room_box = index.boxes[room_leaf]
+        leaves = index.query_contained(room_box[:3], room_box[3:])
+        leaves = leaves[leaves != room_leaf]
+    else:
+        raise HTTPException(status_code=400, detail=f"Unknown query type: {query}")
+
+    return json_response(request, {
+        'query': query,
+        'count': int(len(leaves)),
+        'elements': index.describe(leaves[:limit])
+    })
+
+# Diffs of completed jobs never change, so recent results are kept
+diff_results: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+diff_results_lock = threading.Lock()
+DIFF_CACHE_SIZE = 32
+
+def compute_diff(job_id: str, other_job_id: str, details: bool, limit: int) -> Dict[str, Any]:
+    """Diff two completed jobs (blocking: downloads and parses property databases)"""
+    key = (job_id, other_job_id, details, limit)
+    with diff_results_lock:
+        if key in diff_results:
+            diff_results.move_to_end(key)
+            return diff_results[key]
+
+    # Digests are built one model at a time so only one property DB is held in memory
+    base = get_model_digest(job_id)
+    target = get_model_digest(other_job_id)
+    result = diff_digests(base, target)
+
+    modified = [
+        {'externalId': str(base.external_ids[b]), 'dbId': int(base.dbids[b]), 'newDbId': int(target.dbids[t])}
+        for b, t in zip(result['modified_base'][:limit], result['modified_target'][:limit])
+    ]
+
+    if details and modified:
+        base_db = load_property_db(job_id)
+        before = [base_db.get_properties(m['dbId']) for m in modified]
+        del base_db
+        target_db = load_property_db(other_job_id)
+        for element, props in zip(modified, before):
+            element['changes'] = changed_parameters(props, target_db.get_properties(element['newDbId']))
+        del target_db
+
+        base_index = get_spatial_index(job_id)
+        target_index = get_spatial_index(other_job_id)
+        if base_index is not None and target_index is not None:
+            for element in modified:
+                old_leaf = base_index.leaf_for_dbid(element['dbId'])
+                new_leaf = target_index.leaf_for_dbid(element['newDbId'])
+                if old_leaf is not None and new_leaf is not None:
+                    old_box = base_index.boxes[old_leaf]
+                    new_box = target_index.boxes[new_leaf]
+                    if not np.allclose(old_box, new_box):
+                        element['bbox'] = {'old': old_box.tolist(), 'new': new_box.tolist()}
+
+    result_body = {
+        'base_job_id': job_id,
+        'target_job_id': other_job_id,
+        'summary': {
+            'added': int(len(result['added'])),
+            'removed': int(len(result['removed'])),
+            'modified': int(len(result['modified_base'])),
+            'unchanged': int(len(base.external_ids) - len(result['removed']) - len(result['modified_base']))
+        },
+        'added': describe_elements(target, result['added'][:limit]),
+        'removed': describe_elements(base, result['removed'][:limit]),
+        'modified': modified
+    }
+    with diff_results_lock:
+        diff_results[key] = result_body
+        if len(diff_results) > DIFF_CACHE_SIZE:
+            diff_results.popitem(last=False)
+    return result_body
+
+@app.get("/api/models/{job_id}/diff/{other_job_id}")
+async def diff_models(request: Request, job_id: str, other_job_id: str, details: bool = False, limit: int = 1000):
+    """Element-level diff between two model versions, matched by externalId
+
+    The summary comes from cached digests alone; details=true also lists changed
+    parameters, which means parsing both property databases.
+    """
+    for jid in (job_id, other_job_id):
+        if jid not in processing_jobs:
+            raise HTTPException(status_code=404, detail=f"Job not found: {jid}")
+        if processing_jobs[jid]['status'] != 'completed' or not processing_jobs[jid].get('urn'):
+            raise HTTPException(status_code=400, detail=f"Model not ready: {jid}")
+
+    try:
+        result = await asyncio.to_thread(compute_diff, job_id, other_job_id, details, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to diff models: {str(e)}")
+    # Both jobs are completed, so the diff is fixed for these parameters
+    return json_response(request, result, etag=make_etag('diff', job_id, other_job_id, details, limit))
+
+@app.post("/api/models/{job_id}/export")
+async def start_offline_export(job_id: str, background_tasks: BackgroundTasks):
+    """Start (or resume) exporting a model's derivatives into an offline archive"""
+    if job_id not in processing_jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
     
-    return {"models": models}
+    job_data = processing_jobs[job_id]
+    if job_data['status'] != 'completed':
+        raise HTTPException(status_code=400, detail="Model not ready for export")
+    
+    if job_data.get('export', {}).get('status') == 'exporting':
+        return job_data['export']
+    
+    job_data['export'] = {'status': 'exporting', 'files_total': 0, 'files_done': 0, 'bytes': 0}
+    background_tasks.add_task(run_offline_export, job_id)
+    return job_data['export']
+
+@app.get("/api/models/{job_id}/export")
+async def get_offline_export(job_id: str):
+    """Progress of an offline export"""
+    if job_id not in processing_jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    export = processing_jobs[job_id].get('export')
+    if not export:
+        raise HTTPException(status_code=404, detail="No export for this model")
+    return {k: v for k, v in export.items() if k != 'archive'}
+
+@app.get("/api/offline/{job_id}/archive")
+async def download_offline_archive(job_id: str):
+    """The whole archive, for carrying to an air-gapped site"""
+    archive = get_offline_archive(job_id)
+    if archive is None:
+        raise HTTPException(status_code=404, detail="Offline archive not available")
+    return FileResponse(archive.path, media_type='application/zip', filename=archive.path.name)
+
+@app.get("/api/offline/{job_id}/files/{path:path}")
+async def get_offline_file(job_id: str, path: str):
+    """Serve one derivative straight out of the archive (viewer env 'Local')"""
+    archive = get_offline_archive(job_id)
+    if archive is None:
+        raise HTTPException(status_code=404, detail="Offline archive not available")
+    
+    content = await asyncio.to_thread(archive.read, path)
+    if content is None:
+        raise HTTPException(status_code=404, detail="File not found in archive")
+    
+    media_type = 'application/json' if path.endswith('.json') else 'application/octet-stream'
+    return Response(content=content, media_type=media_type, headers={
+        'Cache-Control': 'public, max-age=31536000, immutable'
+    })
+
+@app.get("/api/models/{job_id}/thumbnail")
+async def get_model_thumbnail(request: Request, job_id: str, size: int = DEFAULT_THUMBNAIL_SIZE):
+    """Serve a cached model thumbnail (100, 200 or 400 px)"""
+    if job_id not in processing_jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    job_data = processing_jobs[job_id]
+    if job_data['status'] != 'completed':
+        raise HTTPException(status_code=400, detail="Model not ready")
+    
+    size = closest_size(size)
+    digest = job_data.get('thumbnails', {}).get(size)
+    if not thumbnail_cache.has(digest):
+        # Models translated before thumbnails were cached are filled in once, on first request
+        try:
+            job_data['thumbnails'] = await asyncio.to_thread(
+                thumbnail_cache.fetch_all, get_job_client(job_id), job_data['urn']
+            )
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Thumbnail not available: {str(e)}")
+        update_catalog(job_id)
+        digest = job_data['thumbnails'][size]
+    
+    etag = f'"{digest}"'
+    headers = {'ETag': etag, 'Cache-Control': 'public, max-age=31536000, immutable'}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(thumbnail_cache.path(digest), media_type='image/png', headers=headers)
+
+@app.get("/api/models")
+async def list_models(request: Request, page: int = 1, page_size: int = 50):
+    """List processed models, newest first, one page at a time"""
+    page = max(page, 1)
+    page_size = min(max(page_size, 1), MAX_CATALOG_PAGE_SIZE)
+    etag = make_etag('models', CATALOG_BOOT_ID, catalog_version, page, page_size)
+    offset = (page - 1) * page_size
+    models = list(islice(reversed(model_catalog.values()), offset, offset + page_size))
+    total = len(model_catalog)
+    return json_response(request, {
+        "models": models,
+        "page": page,
+        "page_size": page_size,
+        "total": total,
+        "has_more": offset + page_size < total
+    }, etag=etag)
 
 @app.delete("/api/models/{job_id}")
 async def delete_model(job_id: str):
     """Delete a model (clean up job data)"""
     if job_id in processing_jobs:
         del processing_jobs[job_id]
+        remove_from_catalog(job_id)
+        await asyncio.to_thread(delete_job_data, job_id)
         return {"message": "Model deleted successfully"}
     else:
         raise HTTPException(status_code=404, detail="Job not found")
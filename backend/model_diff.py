@@ -0,0 +1,135 @@
+import hashlib
+import json
+import uuid
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+
+from svf_reader import PropertyDatabase
+from spatial_index import SpatialIndex
+
+# Bounding boxes are compared at this precision (model units)
+BBOX_DECIMALS = 4
+
+
+def _hash64(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, applied element-wise"""
+    with np.errstate(over='ignore'):
+        v = values.astype(np.uint64)
+        v ^= v >> np.uint64(30)
+        v *= np.uint64(0xbf58476d1ce4e5b9)
+        v ^= v >> np.uint64(27)
+        v *= np.uint64(0x94d049bb133111eb)
+        v ^= v >> np.uint64(31)
+    return v
+
+
+class ModelDigest:
+    """Per-element content hashes of one model version, sorted by externalId
+
+    Property and bounding-box hashes are kept apart (a zero box hash means the
+    element has no box) so a model without a spatial index still diffs cleanly.
+    """
+
+    def __init__(self, external_ids: np.ndarray, dbids: np.ndarray, hashes: np.ndarray,
+                 box_hashes: Optional[np.ndarray] = None):
+        self.external_ids = external_ids
+        self.dbids = dbids
+        self.hashes = hashes
+        self.box_hashes = box_hashes if box_hashes is not None else np.zeros(len(hashes), dtype=np.uint64)
+
+    @classmethod
+    def from_property_db(cls, db: PropertyDatabase, index: Optional[SpatialIndex] = None) -> 'ModelDigest':
+        """Hash every element's properties (and bounding box) without building per-element dicts"""
+        # Hash each distinct attribute and value once; DbKey attributes are zeroed out
+        attr_hashes = np.zeros(len(db.attrs), dtype=np.uint64)
+        for i in range(len(db.attrs)):
+            key = db.attribute_key(i)
+            if key is not None:
+                attr_hashes[i] = _hash64(key)
+        val_hashes = np.array(
+            [_hash64(json.dumps(v, sort_keys=True)) for v in db.vals], dtype=np.uint64
+        )
+
+        pairs = db.avs
+        with np.errstate(over='ignore'):
+            pair_hashes = _mix(attr_hashes[pairs[:, 0]] ^ _mix(val_hashes[pairs[:, 1]]))
+            pair_hashes[attr_hashes[pairs[:, 0]] == 0] = 0
+            # Order-independent sum per element via wrapping prefix sums
+            prefix = np.concatenate([np.zeros(1, dtype=np.uint64), np.cumsum(pair_hashes, dtype=np.uint64)])
+            ends = np.append(db.offs[1:], len(pairs))
+            hashes = prefix[ends] - prefix[db.offs]
+
+        box_hashes = np.zeros(len(hashes), dtype=np.uint64)
+        if index is not None and len(index):
+            rounded = np.round(index.boxes, BBOX_DECIMALS)
+            row_hashes = np.array([_hash64(repr(row)) for row in rounded.tolist()], dtype=np.uint64)
+            in_range = index.dbids < len(hashes)
+            # _mix is a bijection with _mix(0) == 0, so 0 stays free to mean "no box"
+            box_hashes[index.dbids[in_range]] = _mix(row_hashes[in_range])
+
+        external_ids = np.array([str(x) if x else '' for x in db.ids[:len(hashes)]])
+        dbids = np.arange(len(external_ids), dtype=np.int64)
+        keep = external_ids != ''
+        external_ids, dbids = external_ids[keep], dbids[keep]
+        hashes, box_hashes = hashes[:len(keep)][keep], box_hashes[:len(keep)][keep]
+
+        external_ids, first = np.unique(external_ids, return_index=True)
+        return cls(external_ids, dbids[first], hashes[first], box_hashes[first])
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp, 'wb') as f:
+            np.savez(f, external_ids=self.external_ids, dbids=self.dbids, hashes=self.hashes,
+                     box_hashes=self.box_hashes)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional['ModelDigest']:
+        """Load a saved digest; None for files written before box hashes were stored separately"""
+        with np.load(path, allow_pickle=False) as data:
+            if 'box_hashes' not in data.files:
+                return None
+            return cls(data['external_ids'], data['dbids'], data['hashes'], data['box_hashes'])
+
+
+def diff_digests(base: ModelDigest, target: ModelDigest) -> Dict[str, np.ndarray]:
+    """Sorted merge-join of two digests on externalId"""
+    in_target = np.isin(base.external_ids, target.external_ids, assume_unique=True)
+    in_base = np.isin(target.external_ids, base.external_ids, assume_unique=True)
+
+    common_base = np.flatnonzero(in_target)
+    common_target = np.searchsorted(target.external_ids, base.external_ids[common_base])
+    changed = base.hashes[common_base] != target.hashes[common_target]
+    # Geometry only counts when both versions know the element's box
+    base_boxes = base.box_hashes[common_base]
+    target_boxes = target.box_hashes[common_target]
+    changed |= (base_boxes != 0) & (target_boxes != 0) & (base_boxes != target_boxes)
+
+    return {
+        'removed': np.flatnonzero(~in_target),
+        'added': np.flatnonzero(~in_base),
+        'modified_base': common_base[changed],
+        'modified_target': common_target[changed]
+    }
+
+
+def changed_parameters(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    changes = {}
+    for key in before.keys() | after.keys():
+        if before.get(key) != after.get(key):
+            changes[key] = {'old': before.get(key), 'new': after.get(key)}
+    return changes
+
+
+def describe_elements(digest: ModelDigest, rows: np.ndarray) -> List[Dict[str, Any]]:
+    return [
+        {'externalId': str(digest.external_ids[r]), 'dbId': int(digest.dbids[r])}
+        for r in rows
+    ]
@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import contextvars
+import shutil
+import hashlib
+import zipfile
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, Dict, Any, List
+
+import svf_reader
+
+EXPORT_DIR = Path(os.getenv('EXPORT_DIR', './models/export'))
+EXPORT_CONCURRENCY = int(os.getenv('EXPORT_CONCURRENCY', '8'))
+DERIVATIVE_URN_PREFIX = 'urn:adsk.viewing:fs.file:'
+
+
+def derivative_path(derivative_urn: str) -> str:
+    """Archive path for a derivative, keeping the folder layout the viewer resolves against"""
+    if derivative_urn.startswith(DERIVATIVE_URN_PREFIX):
+        rest = derivative_urn[len(DERIVATIVE_URN_PREFIX):]
+        if '/' in rest:
+            return rest.split('/', 1)[1]
+    return 'other/' + hashlib.sha1(derivative_urn.encode('utf-8')).hexdigest()
+
+
+def manifest_derivative_urns(manifest: Dict[str, Any]) -> List[str]:
+    """Every downloadable file referenced by an SVF manifest (SVFs, thumbnails, property DB, ...)"""
+    urns = []
+
+    def walk(node):
+        if node.get('urn'):
+            urns.append(node['urn'])
+        for child in node.get('children', []):
+            walk(child)
+
+    for derivative in manifest.get('derivatives', []):
+        if derivative.get('outputType') in ('svf', 'thumbnail'):
+            walk(derivative)
+    return list(dict.fromkeys(urns))
+
+
+class OfflineExporter:
+    """Downloads every derivative of a URN in parallel and packs them into one indexed archive
+
+    Files are staged under EXPORT_DIR/<job_id>/files; completed files are kept and
+    partial ones are resumed with a Range request, so an interrupted export picks
+    up where it stopped. The archive is an uncompressed zip (derivatives are
+    already gzipped) whose central directory gives random access to each file.
+    """
+
+    def __init__(self, client, job_id: str, urn: str, concurrency: int = EXPORT_CONCURRENCY,
+                 progress: Optional[Dict[str, Any]] = None):
+        self.client = client
+        self.job_id = job_id
+        self.urn = urn
+        self.concurrency = max(concurrency, 1)
+        self.root = EXPORT_DIR / job_id
+        self.staging = self.root / 'files'
+        self.progress = progress if progress is not None else {}
+        self._lock = threading.Lock()
+
+    @property
+    def archive_path(self) -> Path:
+        return self.root / f"{self.job_id}.zip"
+
+    def _staged(self, derivative_urn: str) -> Path:
+        return self.staging / derivative_path(derivative_urn)
+
+    def _fetch(self, derivative_urn: str) -> int:
+        target = self._staged(derivative_urn)
+        if target.exists():
+            size = target.stat().st_size
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            partial = target.with_name(target.name + '.part')
+            size = self.client.download_derivative_to(self.urn, derivative_urn, str(partial))
+            partial.replace(target)
+        with self._lock:
+            self.progress['files_done'] += 1
+            self.progress['bytes'] += size
+        return size
+
+    def _fetch_all(self, derivative_urns: List[str]):
+        with self._lock:
+            self.progress['files_total'] += len(derivative_urns)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            # Each worker runs in a copy of the caller's context so its spans stay in the export trace
+            futures = {pool.submit(contextvars.copy_context().run, self._fetch, u): u for u in derivative_urns}
+            for future in as_completed(futures):
+                future.result()
+
+    def run(self) -> Path:
+        started = time.time()
+        self.progress.update({'status': 'exporting', 'files_total': 0, 'files_done': 0, 'bytes': 0})
+        manifest = self.client.get_manifest(self.urn)
+        if manifest.get('status') != 'success':
+            raise Exception(f"Translation not complete. Status: {manifest.get('status')}")
+
+        # Pass 1: files listed in the manifest, which include the .svf bubbles
+        top_level = manifest_derivative_urns(manifest)
+        self._fetch_all(top_level)
+
+        # Pass 2: assets referenced from inside each .svf (fragments, geometry packs, textures, ...)
+        assets = []
+        for svf_urn in svf_reader.find_svf_urns(manifest):
+            for asset in svf_reader.read_svf_assets(self._staged(svf_urn).read_bytes()):
+                uri = asset.get('URI')
+                if uri and not uri.startswith('embed:'):
+                    assets.append(svf_reader.resolve_asset_urn(svf_urn, uri))
+        known = set(top_level)
+        assets = [u for u in dict.fromkeys(assets) if u not in known]
+        self._fetch_all(assets)
+
+        svf_paths = [derivative_path(u) for u in svf_reader.find_svf_urns(manifest)]
+        index = {
+            'job_id': self.job_id,
+            'urn': self.urn,
+            'created_at': time.time(),
+            'svf': svf_paths,
+            'files': {derivative_path(u): u for u in top_level + assets}
+        }
+        self._pack(manifest, index)
+        elapsed = time.time() - started
+        # The archive path is in place before anyone can see the export as completed
+        self.progress['archive'] = str(self.archive_path)
+        self.progress.update({
+            'status': 'completed',
+            'archive_bytes': self.archive_path.stat().st_size,
+            'seconds': round(elapsed, 1),
+            'mb_per_second': round(self.progress['bytes'] / 1024 / 1024 / max(elapsed, 1e-6), 2)
+        })
+        print(f"📦 Offline export for job {self.job_id}: {len(index['files'])} files, "
+              f"{self.progress['bytes']:,} bytes in {elapsed:.1f}s")
+        return self.archive_path
+
+    def _pack(self, manifest: Dict[str, Any], index: Dict[str, Any]):
+        tmp_path = self.archive_path.with_suffix('.zip.tmp')
+        with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+            archive.writestr('manifest.json', json.dumps(manifest))
+            archive.writestr('index.json', json.dumps(index))
+            for path in index['files']:
+                archive.write(self.staging / path, arcname=path)
+        tmp_path.replace(self.archive_path)
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+
+class OfflineArchive:
+    """Random-access reader over an exported archive; entries are read without extracting"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.zip = zipfile.ZipFile(path, 'r')
+        self.index = json.loads(self.zip.read('index.json'))
+
+    def read(self, name: str) -> Optional[bytes]:
+        try:
+            return self.zip.read(name)
+        except KeyError:
+            return None
+
+    def close(self):
+        self.zip.close()
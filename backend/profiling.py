@@ -0,0 +1,278 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List
+
+# Samples kept per timing name for percentiles
+TIMING_SAMPLES = 1000
+MAX_PROFILE_SECONDS = 300
+MAX_STACK_DEPTH = 128
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+
+def _stack(frame, limit: int = MAX_STACK_DEPTH) -> List[str]:
+    """Frames from the outermost call down to `frame`"""
+    labels = []
+    while frame is not None and len(labels) < limit:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class SamplingProfiler:
+    """Wall-clock sampler over every thread, producing collapsed stacks for flamegraphs
+
+    A daemon thread reads sys._current_frames() every `interval` seconds for a
+    fixed duration; nothing runs and nothing is hooked when no session is active.
+    Output uses the folded format ("a;b;c 42") read by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self):
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.interval = 0.005
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float, interval: float = 0.005):
+        with self._lock:
+            if self.running:
+                raise RuntimeError("Profiler is already running")
+            self.stacks = Counter()
+            self.samples = 0
+            self.interval = max(interval, 0.001)
+            self.started_at, self.stopped_at = time.time(), None
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(min(seconds, MAX_PROFILE_SECONDS),), name='sampling-profiler', daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self, seconds: float):
+        own_id = threading.get_ident()
+        deadline = time.perf_counter() + seconds
+        while not self._stop.is_set() and time.perf_counter() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = ';'.join([names.get(thread_id, str(thread_id))] + _stack(frame))
+                self.stacks[stack] += 1
+            self.samples += 1
+            self._stop.wait(self.interval)
+        self.stopped_at = time.time()
+
+    def collapsed(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'running': self.running,
+            'started_at': self.started_at,
+            'stopped_at': self.stopped_at,
+            'interval_ms': round(self.interval * 1000, 2),
+            'samples': self.samples,
+            'unique_stacks': len(self.stacks)
+        }
+
+
+class LoopLagMonitor:
+    """Catches callbacks that block the event loop and records what they were doing
+
+    A coroutine on the loop stamps a heartbeat every `interval`. A watchdog
+    thread notices when the heartbeat is late by more than `threshold` and grabs
+    the loop thread's stack while it is still blocked; the coroutine then fills
+    in how long the stall lasted.
+    """
+
+    def __init__(self, max_events: int = 100):
+        self.events: deque = deque(maxlen=max_events)
+        self.threshold = 0.1
+        self.interval = 0.02
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._beat = 0.0
+        self._pending: Optional[Dict[str, Any]] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, threshold: float = 0.1, interval: float = 0.02):
+        """Must be called from the event loop thread"""
+        if self.running:
+            return
+        self.threshold = threshold
+        self.interval = interval
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name='loop-lag-watchdog', daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
+
+    async def _heartbeat(self):
+        while True:
+            self._beat = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - self._beat - self.interval
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.threshold:
+                self.stalls += 1
+                event = self._pending or {'at': time.time(), 'stack': None}
+                event['lag_ms'] = round(lag * 1000, 1)
+                self.events.append(event)
+            self._pending = None
+
+    def _watch(self):
+        while not self._stop.wait(self.interval / 2):
+            beat = self._beat
+            if self._pending is None and time.perf_counter() - beat > self.interval + self.threshold:
+                frame = sys._current_frames().get(self._loop_thread_id)
+                # Only keep the capture if the loop is still inside the same stall
+                if frame is not None and self._beat == beat:
+                    self._pending = {'at': time.time(), 'stack': _stack(frame)}
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'running': self.running,
+            'threshold_ms': round(self.threshold * 1000, 1),
+            'stalls': self.stalls,
+            'max_lag_ms': round(self.max_lag * 1000, 1),
+            'events': list(self.events)
+        }
+
+
+class Timings:
+    """Count, total, max and percentiles per name; recording is a no-op while disabled"""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = {
+                    'count': 0, 'total': 0.0, 'max': 0.0, 'samples': deque(maxlen=TIMING_SAMPLES)
+                }
+            stats['count'] += 1
+            stats['total'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+            stats['samples'].append(seconds)
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+
+    def report(self) -> Dict[str, Any]:
+        report = {}
+        with self._lock:
+            items = [(name, dict(stats, samples=sorted(stats['samples']))) for name, stats in self.stats.items()]
+        for name, stats in sorted(items, key=lambda item: -item[1]['total']):
+            samples = stats['samples']
+
+            def pct(p):
+                return round(samples[min(int(len(samples) * p), len(samples) - 1)] * 1000, 2)
+
+            report[name] = {
+                'count': stats['count'],
+                'total_ms': round(stats['total'] * 1000, 1),
+                'mean_ms': round(stats['total'] / stats['count'] * 1000, 2),
+                'p50_ms': pct(0.5),
+                'p95_ms': pct(0.95),
+                'p99_ms': pct(0.99),
+                'max_ms': round(stats['max'] * 1000, 2)
+            }
+        return report
+
+
+class TimingMiddleware:
+    """ASGI middleware recording per-endpoint timings, keyed by route template
+
+    Plain ASGI rather than BaseHTTPMiddleware: while timings are disabled a
+    request costs one attribute check on its way through.
+    """
+
+    def __init__(self, app, timings: 'Timings'):
+        self.app = app
+        self.timings = timings
+        self._templates: Dict[Any, str] = {}
+
+    def _template(self, scope) -> str:
+        endpoint = scope.get('endpoint')
+        if endpoint not in self._templates and 'app' in scope:
+            # Group /api/models/abc and /api/models/def under /api/models/{job_id}
+            self._templates.update({
+                route.endpoint: route.path for route in scope['app'].routes if hasattr(route, 'endpoint')
+            })
+        return self._templates.get(endpoint, 'unmatched')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.timings.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.timings.record(f"{scope['method']} {self._template(scope)}", time.perf_counter() - started)
+
+
+@contextmanager
+def hot_path(name: str):
+    """Time a block into `timings` when timing is enabled"""
+    if not timings.enabled:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.record(name, time.perf_counter() - started)
+
+
+profiler = SamplingProfiler()
+loop_monitor = LoopLagMonitor()
+timings = Timings(enabled=os.getenv('ENDPOINT_TIMINGS', '').lower() in ('1', 'true', 'yes'))
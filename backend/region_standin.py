@@ -0,0 +1,123 @@
+"""Local stand-in for regional APS endpoints with simulated latency
+
+Run one HTTP server per region, each delaying its response headers:
+
+    python region_standin.py US=40 EMEA=150 AUS=300
+
+then point the backend at them with the printed APS_REGIONS / APS_BASE_URL_<R>
+lines. With --check it instead verifies that RegionRouter measures the
+simulated latencies and routes to the fastest region, including when the
+fastest region also serves large bodies.
+"""
+import os
+import sys
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Tuple
+
+import requests
+
+BASE_PORT = int(os.getenv('STANDIN_BASE_PORT', '9001'))
+# GET /large returns this many bytes, to check that body size is not read as latency
+LARGE_BODY_SIZE = 8 * 1024 * 1024
+
+
+def make_handler(region: str, delay: float):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, body: bytes = b'{}', content_type: str = 'application/json'):
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('x-standin-region', region)
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.wfile.write(body)
+
+        def do_HEAD(self):
+            self._reply()
+
+        def do_GET(self):
+            if self.path.startswith('/large'):
+                self._reply(b'\0' * LARGE_BODY_SIZE, 'application/octet-stream')
+            else:
+                self._reply()
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.path.startswith('/authentication/v2/token'):
+                self._reply(json.dumps({'access_token': f'standin-{region}', 'expires_in': 3600}).encode())
+            else:
+                self._reply()
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_standins(latencies: Dict[str, float]) -> List[Tuple[str, str, ThreadingHTTPServer]]:
+    """Start one server per region ({region: seconds}); returns (region, base_url, server)"""
+    servers = []
+    for offset, (region, delay) in enumerate(latencies.items()):
+        server = ThreadingHTTPServer(('127.0.0.1', BASE_PORT + offset), make_handler(region, delay))
+        threading.Thread(target=server.serve_forever, name=f'standin-{region}', daemon=True).start()
+        servers.append((region, f"http://127.0.0.1:{BASE_PORT + offset}", server))
+    return servers
+
+
+def check(latencies: Dict[str, float]) -> bool:
+    servers = start_standins(latencies)
+    os.environ['APS_REGIONS'] = ','.join(latencies)
+    for region, base_url, _ in servers:
+        os.environ[f'APS_BASE_URL_{region}'] = base_url
+
+    from regions import RegionSettings, RegionRouter
+    router = RegionRouter(RegionSettings())
+    fastest = min(latencies, key=latencies.get)
+
+    # Large downloads from the fastest region must not make it look slow
+    fastest_url = dict((r, u) for r, u, _ in servers)[fastest]
+    for _ in range(3):
+        router.record(fastest, requests.get(f"{fastest_url}/large", timeout=30).elapsed.total_seconds())
+
+    chosen = router.choose()
+    report = router.report()
+    for region, _, server in servers:
+        server.shutdown()
+
+    print(json.dumps(report, indent=2))
+    ok = chosen == fastest
+    for region, delay in latencies.items():
+        measured = report[region]['latency_ms']
+        # Loopback adds a little on top of the simulated delay
+        ok = ok and measured is not None and delay * 1000 <= measured < delay * 1000 + 50
+    print(f"{'✅' if ok else '❌'} Routed to {chosen}, expected {fastest}")
+    return ok
+
+
+def parse_latencies(args: List[str]) -> Dict[str, float]:
+    latencies = {}
+    for arg in args:
+        region, _, ms = arg.partition('=')
+        latencies[region.strip().upper()] = float(ms or 0) / 1000
+    return latencies or {'US': 0.04, 'EMEA': 0.15}
+
+
+if __name__ == '__main__':
+    args = [a for a in sys.argv[1:] if a != '--check']
+    latencies = parse_latencies(args)
+    if '--check' in sys.argv:
+        sys.exit(0 if check(latencies) else 1)
+
+    servers = start_standins(latencies)
+    print(f"APS_REGIONS={','.join(latencies)}")
+    for region, base_url, _ in servers:
+        print(f"APS_BASE_URL_{region}={base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
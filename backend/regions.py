@@ -0,0 +1,146 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any
+
+import requests
+
+DEFAULT_REGION = 'US'
+DEFAULT_BASE_URL = 'https://developer.api.autodesk.com'
+# Viewer `api` option per region; other regions default to derivativeV2_<REGION>
+DEFAULT_VIEWER_APIS = {'US': 'derivativeV2', 'EMEA': 'derivativeV2_EU'}
+
+# Latency estimates older than this are re-probed before routing a job
+LATENCY_TTL = float(os.getenv('APS_REGION_LATENCY_TTL', '300'))
+# Weight of the newest sample in the moving average
+LATENCY_ALPHA = 0.3
+
+
+def _parse_mapping(value: str) -> Dict[str, str]:
+    """Parse 'key:VALUE,key2:VALUE2' into a dict"""
+    mapping = {}
+    for item in value.split(','):
+        if ':' in item:
+            key, _, val = item.partition(':')
+            mapping[key.strip()] = val.strip().upper()
+    return mapping
+
+
+class RegionSettings:
+    """Per-region endpoint and bucket, read from APS_REGIONS and APS_*_<REGION> variables
+
+    APS_REGIONS=US,EMEA
+    APS_BASE_URL_EMEA=http://localhost:9001      # optional, e.g. a local stand-in
+    APS_BUCKET_KEY_EMEA=my-bucket-emea            # default: <APS_BUCKET_KEY>-emea
+    APS_VIEWER_API_AUS=derivativeV2_AUS           # viewer endpoint for the region
+    APS_TENANT_REGIONS=acme:EMEA,contoso:AUS
+    """
+
+    def __init__(self):
+        base_bucket = os.getenv('APS_BUCKET_KEY', 'enhanced-revit-viewer-v3')
+        names = [r.strip().upper() for r in os.getenv('APS_REGIONS', DEFAULT_REGION).split(',') if r.strip()]
+        self.regions: Dict[str, Dict[str, str]] = {}
+        for name in names or [DEFAULT_REGION]:
+            default_bucket = base_bucket if name == DEFAULT_REGION else f"{base_bucket}-{name.lower()}"
+            self.regions[name] = {
+                'base_url': os.getenv(f'APS_BASE_URL_{name}', os.getenv('APS_BASE_URL', DEFAULT_BASE_URL)),
+                'bucket_key': os.getenv(f'APS_BUCKET_KEY_{name}', default_bucket),
+                'viewer_api': os.getenv(f'APS_VIEWER_API_{name}', DEFAULT_VIEWER_APIS.get(name, f'derivativeV2_{name}'))
+            }
+        self.tenants = _parse_mapping(os.getenv('APS_TENANT_REGIONS', ''))
+        self.default = names[0] if names else DEFAULT_REGION
+
+    @property
+    def latency_routing(self) -> bool:
+        """Latency only tells regions apart when each one has its own endpoint
+
+        Every region defaults to the same global base URL, so probing them would
+        just compare noise on one host.
+        """
+        base_urls = {config['base_url'] for config in self.regions.values()}
+        return len(self.regions) > 1 and len(base_urls) == len(self.regions)
+
+
+class RegionRouter:
+    """Chooses a region per job and keeps a moving average of APS latency per region"""
+
+    def __init__(self, settings: RegionSettings):
+        self.settings = settings
+        self.latency: Dict[str, Dict[str, Any]] = {
+            name: {'latency_ms': None, 'samples': 0, 'updated_at': 0.0, 'errors': 0}
+            for name in settings.regions
+        }
+        self._lock = threading.Lock()
+
+    def record(self, region: str, seconds: float):
+        """Fold an observed request time into the region's latency estimate"""
+        stats = self.latency.get(region)
+        if stats is None:
+            return
+        with self._lock:
+            ms = seconds * 1000
+            if stats['latency_ms'] is None:
+                stats['latency_ms'] = ms
+            else:
+                stats['latency_ms'] += LATENCY_ALPHA * (ms - stats['latency_ms'])
+            stats['samples'] += 1
+            stats['updated_at'] = time.time()
+
+    def probe(self, region: str):
+        """Time one lightweight round trip to a region's endpoint"""
+        try:
+            response = requests.head(self.settings.regions[region]['base_url'], timeout=5)
+            self.record(region, response.elapsed.total_seconds())
+        except requests.RequestException:
+            with self._lock:
+                self.latency[region]['errors'] += 1
+                self.latency[region]['updated_at'] = time.time()
+
+    def probe_stale(self):
+        now = time.time()
+        stale = [r for r, s in self.latency.items() if now - s['updated_at'] > LATENCY_TTL]
+        if len(stale) == 1:
+            self.probe(stale[0])
+        elif stale:
+            with ThreadPoolExecutor(max_workers=len(stale)) as pool:
+                list(pool.map(self.probe, stale))
+
+    def choose(self, region: Optional[str] = None, tenant: Optional[str] = None) -> str:
+        """Explicit region, then the tenant's region, then the lowest-latency region
+
+        Latency routing only applies when every region has a distinct base URL;
+        otherwise jobs go to the default region. May probe stale regions over
+        HTTP, so call it from a worker thread.
+        """
+        if region:
+            region = region.upper()
+            if region not in self.settings.regions:
+                raise ValueError(f"Region not configured: {region}")
+            return region
+        if tenant and tenant in self.settings.tenants:
+            tenant_region = self.settings.tenants[tenant]
+            if tenant_region in self.settings.regions:
+                return tenant_region
+        if not self.settings.latency_routing:
+            return self.settings.default
+
+        self.probe_stale()
+        measured = {r: s['latency_ms'] for r, s in self.latency.items() if s['latency_ms'] is not None}
+        if not measured:
+            return self.settings.default
+        return min(measured, key=measured.get)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            name: {
+                'base_url': config['base_url'],
+                'bucket_key': config['bucket_key'],
+                'viewer_api': config['viewer_api'],
+                'latency_ms': round(self.latency[name]['latency_ms'], 1)
+                if self.latency[name]['latency_ms'] is not None else None,
+                'samples': self.latency[name]['samples'],
+                'errors': self.latency[name]['errors']
+            }
+            for name, config in self.settings.regions.items()
+        }
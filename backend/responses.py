@@ -0,0 +1,115 @@
+import os
+import json
+import gzip
+import hashlib
+from typing import Any, Optional, Dict, Sequence
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional speedup
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize to compact JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(',', ':'), allow_nan=False).encode('utf-8')
+
+
+class FastJSONResponse(JSONResponse):
+    """Default response class: same behaviour as JSONResponse, faster encoder"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag from version identifiers (job id, status, manifest version, ...)"""
+    digest = hashlib.sha256('\x1f'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return etag in (tag.strip() for tag in header.split(','))
+
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """Parse Accept-Encoding into {coding: q}, e.g. 'br;q=0, gzip' -> {'br': 0.0, 'gzip': 1.0}"""
+    accepted = {}
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(header: str, available: Sequence[str]) -> Optional[str]:
+    """Best of `available` (listed in order of preference) the client accepts with q > 0"""
+    accepted = accepted_encodings(header)
+    best, best_q = None, 0.0
+    for coding in available:
+        q = accepted.get(coding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def _negotiate_encoding(request: Request) -> Optional[str]:
+    available = ('br', 'gzip') if brotli is not None else ('gzip',)
+    return choose_encoding(request.headers.get('accept-encoding', ''), available)
+
+
+def json_response(request: Request, content: Any, etag: Optional[str] = None,
+                  cache_control: str = 'no-cache', status_code: int = 200) -> Response:
+    """JSON response with conditional GET and br/gzip negotiation
+
+    If no etag is given one is derived from the serialized body.
+    """
+    # 304s carry the same Vary as the 200 they stand in for
+    not_modified_headers = {'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+    if etag is not None and etag_matches(request, etag):
+        return Response(status_code=304, headers={'ETag': etag, **not_modified_headers})
+
+    body = dumps(content)
+    if etag is None:
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers={'ETag': etag, **not_modified_headers})
+
+    headers = {'ETag': etag, 'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+    encoding = _negotiate_encoding(request) if len(body) >= COMPRESS_MIN_SIZE else None
+    if encoding == 'br':
+        body = brotli.compress(body, quality=5)
+    elif encoding == 'gzip':
+        body = gzip.compress(body, compresslevel=6)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+
+    return Response(content=body, status_code=status_code, media_type='application/json', headers=headers)
@@ -0,0 +1,190 @@
+import heapq
+import uuid
+from pathlib import Path
+from typing import Optional, List, Tuple
+
+import numpy as np
+
+NODE_SIZE = 16
+
+
+def _morton_codes(centers: np.ndarray) -> np.ndarray:
+    """Interleave 21-bit quantized x/y/z into a 63-bit Z-order key"""
+    lo = centers.min(axis=0)
+    extent = np.maximum(centers.max(axis=0) - lo, 1e-9)
+    q = ((centers - lo) / extent * ((1 << 21) - 1)).astype(np.uint64)
+
+    def spread(v):
+        v = v & np.uint64(0x1fffff)
+        v = (v | (v << np.uint64(32))) & np.uint64(0x1f00000000ffff)
+        v = (v | (v << np.uint64(16))) & np.uint64(0x1f0000ff0000ff)
+        v = (v | (v << np.uint64(8))) & np.uint64(0x100f00f00f00f00f)
+        v = (v | (v << np.uint64(4))) & np.uint64(0x10c30c30c30c30c3)
+        v = (v | (v << np.uint64(2))) & np.uint64(0x1249249249249249)
+        return v
+
+    return spread(q[:, 0]) | (spread(q[:, 1]) << np.uint64(1)) | (spread(q[:, 2]) << np.uint64(2))
+
+
+class SpatialIndex:
+    """Packed R-tree over element AABBs, stored as flat numpy arrays
+
+    Elements are sorted along a Z-order curve and grouped NODE_SIZE at a time;
+    each level above holds the union boxes of NODE_SIZE children of the level
+    below. Queries descend level by level with vectorized box tests.
+    """
+
+    def __init__(self, dbids: np.ndarray, boxes: np.ndarray, external_ids: Optional[np.ndarray] = None):
+        self.dbids = np.asarray(dbids, dtype=np.int64)
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 6)
+        self.external_ids = external_ids
+        self.levels: List[np.ndarray] = []
+        self._dbid_order = None
+
+        if len(self.dbids):
+            centers = (self.boxes[:, :3] + self.boxes[:, 3:]) * 0.5
+            order = np.argsort(_morton_codes(centers), kind='stable')
+            self.dbids = self.dbids[order]
+            self.boxes = self.boxes[order]
+            if self.external_ids is not None:
+                self.external_ids = self.external_ids[order]
+            self._build_levels()
+
+    def _build_levels(self):
+        level = self.boxes
+        while len(level) > 1:
+            starts = np.arange(0, len(level), NODE_SIZE)
+            mins = np.minimum.reduceat(level[:, :3], starts, axis=0)
+            maxs = np.maximum.reduceat(level[:, 3:], starts, axis=0)
+            level = np.hstack([mins, maxs])
+            self.levels.append(level)
+        self.levels.reverse()  # root first
+
+    def __len__(self):
+        return len(self.dbids)
+
+    @property
+    def bounds(self) -> Optional[List[float]]:
+        if not len(self.dbids):
+            return None
+        root = self.levels[0][0] if self.levels else self.boxes[0]
+        return root.tolist()
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self, path: Path):
+        arrays = {'dbids': self.dbids, 'boxes': self.boxes}
+        if self.external_ids is not None:
+            arrays['external_ids'] = self.external_ids
+        for i, level in enumerate(self.levels):
+            arrays[f'level_{i}'] = level
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a unique temp file and rename, so readers never see a partial index
+        tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp, 'wb') as f:
+            np.savez(f, **arrays)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> 'SpatialIndex':
+        with np.load(path, allow_pickle=False) as data:
+            index = cls.__new__(cls)
+            index.dbids = data['dbids']
+            index.boxes = data['boxes']
+            index.external_ids = data['external_ids'] if 'external_ids' in data.files else None
+            level_keys = sorted((k for k in data.files if k.startswith('level_')), key=lambda k: int(k[6:]))
+            index.levels = [data[k] for k in level_keys]
+            index._dbid_order = None
+        return index
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _candidates(self, predicate) -> np.ndarray:
+        """Indices of leaf boxes reachable through nodes accepted by predicate"""
+        if not len(self.dbids):
+            return np.empty(0, dtype=np.int64)
+        nodes = np.array([0], dtype=np.int64)
+        for depth, level in enumerate(self.levels):
+            nodes = nodes[predicate(level[nodes])]
+            if not len(nodes):
+                return nodes
+            child_count = len(self.levels[depth + 1]) if depth + 1 < len(self.levels) else len(self.boxes)
+            nodes = (nodes[:, None] * NODE_SIZE + np.arange(NODE_SIZE)).ravel()
+            nodes = nodes[nodes < child_count]
+        return nodes[predicate(self.boxes[nodes])]
+
+    def query_box(self, box_min, box_max) -> np.ndarray:
+        """Leaf indices of elements whose AABB intersects the query box"""
+        lo = np.asarray(box_min, dtype=np.float64)
+        hi = np.asarray(box_max, dtype=np.float64)
+        return self._candidates(
+            lambda b: np.all(b[:, :3] <= hi, axis=1) & np.all(b[:, 3:] >= lo, axis=1)
+        )
+
+    def query_point(self, point) -> np.ndarray:
+        """Leaf indices of elements whose AABB contains the point"""
+        return self.query_box(point, point)
+
+    def query_contained(self, box_min, box_max) -> np.ndarray:
+        """Leaf indices of elements whose AABB centre lies inside the query box"""
+        lo = np.asarray(box_min, dtype=np.float64)
+        hi = np.asarray(box_max, dtype=np.float64)
+        hits = self.query_box(lo, hi)
+        centers = (self.boxes[hits, :3] + self.boxes[hits, 3:]) * 0.5
+        return hits[np.all((centers >= lo) & (centers <= hi), axis=1)]
+
+    def query_nearest(self, point, count: int = 10) -> List[Tuple[int, float]]:
+        """Best-first search for the count elements nearest to the point"""
+        if not len(self.dbids) or count <= 0:
+            return []
+        p = np.asarray(point, dtype=np.float64)
+
+        def distances(b):
+            d = np.maximum(np.maximum(b[:, :3] - p, p - b[:, 3:]), 0.0)
+            return np.sqrt((d * d).sum(axis=1))
+
+        depth_count = len(self.levels)
+        # Heap items: (distance, depth, index); depth == depth_count means a leaf
+        if depth_count:
+            heap = [(float(distances(self.levels[0][:1])[0]), 0, 0)]
+        else:
+            heap = [(float(distances(self.boxes[:1])[0]), 0, 0)]
+        results = []
+        while heap and len(results) < count:
+            dist, depth, index = heapq.heappop(heap)
+            if depth == depth_count:
+                results.append((int(index), dist))
+                continue
+            children = self.levels[depth + 1] if depth + 1 < depth_count else self.boxes
+            start = index * NODE_SIZE
+            end = min(start + NODE_SIZE, len(children))
+            for offset, child_dist in enumerate(distances(children[start:end])):
+                heapq.heappush(heap, (float(child_dist), depth + 1, start + offset))
+        return results
+
+    def leaf_for_dbid(self, dbid: int) -> Optional[int]:
+        if self._dbid_order is None:
+            self._dbid_order = np.argsort(self.dbids, kind='stable')
+        sorted_ids = self.dbids[self._dbid_order]
+        pos = int(np.searchsorted(sorted_ids, dbid))
+        if pos < len(sorted_ids) and sorted_ids[pos] == dbid:
+            return int(self._dbid_order[pos])
+        return None
+
+    def describe(self, leaves) -> List[dict]:
+        """Turn leaf indices into JSON-friendly element records"""
+        elements = []
+        for leaf in leaves:
+            leaf = int(leaf)
+            element = {
+                'dbId': int(self.dbids[leaf]),
+                'bbox': self.boxes[leaf].tolist()
+            }
+            if self.external_ids is not None:
+                element['externalId'] = str(self.external_ids[leaf])
+            elements.append(element)
+        return elements
@@ -0,0 +1,250 @@
+import gzip
+import io
+import json
+import posixpath
+import struct
+import zipfile
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+
+SVF_MIME = 'application/autodesk-svf'
+FRAGMENT_LIST_TYPE = 'Autodesk.CloudPlatform.FragmentList'
+PROPERTY_DB_TYPE = 'Autodesk.CloudPlatform.PropertyDatabase'
+
+
+def _maybe_gunzip(data: bytes) -> bytes:
+    if data[:2] == b'\x1f\x8b':
+        return gzip.decompress(data)
+    return data
+
+
+class PackFileReader:
+    """Minimal reader for the SVF '.pack' container format"""
+
+    def __init__(self, data: bytes):
+        self.buffer = _maybe_gunzip(data)
+        self.offset = 0
+
+        self.type = self.get_string()
+        self.version = self.get_int32()
+
+        # Entry and type tables are referenced by the last 8 bytes of the file
+        self.offset = len(self.buffer) - 8
+        entries_offset = self.get_uint32()
+        types_offset = self.get_uint32()
+
+        self.offset = entries_offset
+        self.entries = [self.get_uint32() for _ in range(self.get_varint())]
+
+        self.offset = types_offset
+        self.types = []
+        for _ in range(self.get_varint()):
+            self.types.append({
+                'class': self.get_string(),
+                'type': self.get_string(),
+                'version': self.get_varint()
+            })
+
+    def seek_entry(self, index: int) -> Dict[str, Any]:
+        self.offset = self.entries[index]
+        return self.types[self.get_uint32()]
+
+    def get_varint(self) -> int:
+        result = 0
+        shift = 0
+        while True:
+            byte = self.buffer[self.offset]
+            self.offset += 1
+            result |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                return result
+
+    def get_string(self) -> str:
+        length = self.get_varint()
+        value = self.buffer[self.offset:self.offset + length].decode('utf-8')
+        self.offset += length
+        return value
+
+    def _unpack(self, fmt: str):
+        values = struct.unpack_from(fmt, self.buffer, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return values
+
+    def get_uint8(self) -> int:
+        return self._unpack('<B')[0]
+
+    def get_int32(self) -> int:
+        return self._unpack('<i')[0]
+
+    def get_uint32(self) -> int:
+        return self._unpack('<I')[0]
+
+    def get_floats(self, count: int) -> Tuple[float, ...]:
+        return self._unpack(f'<{count}f')
+
+    def get_translation(self) -> Optional[Tuple[float, float, float]]:
+        """Read a fragment transform, returning only its translation part"""
+        transform_type = self.get_uint8()
+        if transform_type == 0:  # translation
+            return self._unpack('<3d')
+        if transform_type == 1:  # rotation + translation
+            self.get_floats(4)
+            return self._unpack('<3d')
+        if transform_type == 2:  # uniform scale + rotation + translation
+            self.get_floats(5)
+            return self._unpack('<3d')
+        if transform_type == 3:  # affine matrix
+            self.get_floats(9)
+            return self._unpack('<3d')
+        return None  # identity
+
+
+def parse_fragment_list(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """Parse FragmentList.pack into (dbids, boxes) arrays, one row per fragment"""
+    reader = PackFileReader(data)
+    count = len(reader.entries)
+    dbids = np.empty(count, dtype=np.int64)
+    boxes = np.empty((count, 6), dtype=np.float64)
+
+    for i in range(count):
+        entry_type = reader.seek_entry(i)
+        reader.get_uint8()  # flags
+        reader.get_varint()  # material id
+        reader.get_varint()  # geometry id
+        translation = reader.get_translation()
+        bbox = np.asarray(reader.get_floats(6), dtype=np.float64)
+        # Newer pack versions store boxes relative to the fragment translation
+        if entry_type['version'] > 3 and translation is not None:
+            bbox += np.tile(translation, 2)
+        boxes[i] = bbox
+        dbids[i] = reader.get_varint()
+
+    return dbids, boxes
+
+
+def merge_boxes_by_dbid(dbids: np.ndarray, boxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Union fragment boxes that belong to the same element"""
+    if len(dbids) == 0:
+        return dbids, boxes
+    order = np.argsort(dbids, kind='stable')
+    sorted_ids = dbids[order]
+    sorted_boxes = boxes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+    mins = np.minimum.reduceat(sorted_boxes[:, :3], starts, axis=0)
+    maxs = np.maximum.reduceat(sorted_boxes[:, 3:], starts, axis=0)
+    return sorted_ids[starts], np.hstack([mins, maxs])
+
+
+def find_svf_urns(manifest: Dict[str, Any]) -> List[str]:
+    """Return derivative URNs of every SVF file in a manifest"""
+    urns = []
+
+    def walk(node):
+        if node.get('mime') == SVF_MIME and node.get('urn'):
+            urns.append(node['urn'])
+        for child in node.get('children', []):
+            walk(child)
+
+    for derivative in manifest.get('derivatives', []):
+        if derivative.get('outputType') == 'svf':
+            walk(derivative)
+    return urns
+
+
+def get_viewables(manifest: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """List the 2D/3D viewables of an SVF manifest, 3D views first"""
+    viewables = []
+
+    def walk(node):
+        if node.get('type') == 'geometry' and node.get('role') in ('2d', '3d'):
+            viewables.append({
+                'guid': node.get('guid'),
+                'viewableID': node.get('viewableID'),
+                'name': node.get('name', 'Unknown'),
+                'role': node.get('role')
+            })
+        for child in node.get('children', []):
+            walk(child)
+
+    for derivative in manifest.get('derivatives', []):
+        if derivative.get('outputType') == 'svf':
+            walk(derivative)
+    viewables.sort(key=lambda v: v['role'] != '3d')
+    return viewables
+
+
+def read_svf_assets(svf_data: bytes) -> List[Dict[str, Any]]:
+    """Read the asset list from the manifest.json inside a .svf archive"""
+    with zipfile.ZipFile(io.BytesIO(svf_data)) as archive:
+        manifest = json.loads(archive.read('manifest.json'))
+    return manifest.get('assets', [])
+
+
+def resolve_asset_urn(svf_urn: str, uri: str) -> str:
+    """Resolve an asset URI relative to the folder of its .svf derivative"""
+    base = svf_urn.rsplit('/', 1)[0]
+    return posixpath.normpath(f"{base}/{uri}")
+
+
+def load_json_asset(data: bytes):
+    return json.loads(_maybe_gunzip(data))
+
+
+# Property database files, as referenced from an SVF's asset list
+PROPERTY_DB_FILES = ('ids', 'attrs', 'vals', 'avs', 'offs')
+
+# Attribute data type used for references to other dbIds
+DB_KEY_TYPE = 11
+
+
+class PropertyDatabase:
+    """Read-only view over the objects_*.json.gz property database"""
+
+    def __init__(self, files: Dict[str, Any]):
+        self.ids = files['ids']
+        self.attrs = files['attrs']
+        self.vals = files['vals']
+        self.avs = np.asarray(files['avs'], dtype=np.int64).reshape(-1, 2)
+        self.offs = np.asarray(files['offs'], dtype=np.int64)
+
+    @classmethod
+    def find_assets(cls, assets: List[Dict[str, Any]]) -> Dict[str, str]:
+        """Map property DB file names to asset URNs"""
+        found = {}
+        for asset in assets:
+            if asset.get('type') != PROPERTY_DB_TYPE or not asset.get('urn'):
+                continue
+            filename = asset['urn'].rsplit('/', 1)[-1]
+            for name in PROPERTY_DB_FILES:
+                if filename == f"objects_{name}.json.gz":
+                    found[name] = asset['urn']
+        missing = [name for name in PROPERTY_DB_FILES if name not in found]
+        if missing:
+            raise Exception(f"Property database incomplete, missing: {', '.join(missing)}")
+        return found
+
+    def __len__(self):
+        return len(self.offs)
+
+    def attribute_key(self, index: int) -> Optional[str]:
+        """'Category/Name' key for an attribute, or None for dbId references"""
+        attr = self.attrs[index]
+        if not isinstance(attr, list) or len(attr) < 3 or attr[2] == DB_KEY_TYPE:
+            return None
+        return f"{attr[1] or ''}/{attr[0]}"
+
+    def pair_range(self, dbid: int) -> Tuple[int, int]:
+        start = int(self.offs[dbid])
+        end = int(self.offs[dbid + 1]) if dbid + 1 < len(self.offs) else len(self.avs)
+        return start, end
+
+    def get_properties(self, dbid: int) -> Dict[str, Any]:
+        properties = {}
+        start, end = self.pair_range(dbid)
+        for attr_index, val_index in self.avs[start:end]:
+            key = self.attribute_key(int(attr_index))
+            if key is not None:
+                properties[key] = self.vals[int(val_index)]
+        return properties
@@ -0,0 +1,55 @@
+import os
+import uuid
+import hashlib
+from pathlib import Path
+from typing import Optional, Dict
+
+THUMBNAIL_DIR = Path(os.getenv('THUMBNAIL_DIR', './models/thumbnails'))
+# Sizes the Model Derivative thumbnail endpoint can render
+THUMBNAIL_SIZES = (100, 200, 400)
+DEFAULT_THUMBNAIL_SIZE = 200
+
+
+class ThumbnailCache:
+    """Content-addressed PNG store: each file is named by the SHA-256 of its bytes
+
+    Identical thumbnails (re-uploads of the same model) share one file, and a
+    digest never changes meaning, so responses can be cached as immutable.
+    """
+
+    def __init__(self, root: Path = THUMBNAIL_DIR):
+        self.root = root
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.png"
+
+    def has(self, digest: Optional[str]) -> bool:
+        return bool(digest) and self.path(digest).exists()
+
+    def store(self, content: bytes) -> str:
+        digest = hashlib.sha256(content).hexdigest()
+        target = self.path(digest)
+        if not target.exists():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            # Unique per call: threads of one process may store the same digest at once
+            tmp = target.with_name(f"{target.name}.{uuid.uuid4().hex}.tmp")
+            tmp.write_bytes(content)
+            try:
+                tmp.replace(target)
+            except OSError:
+                tmp.unlink(missing_ok=True)
+                # Another writer got there first (e.g. Windows refuses to replace an open file)
+                if not target.exists():
+                    raise
+        return digest
+
+    def fetch_all(self, client, urn: str) -> Dict[int, str]:
+        """Download every thumbnail size for a URN; returns {size: digest}"""
+        return {size: self.store(client.get_thumbnail(urn, size)) for size in THUMBNAIL_SIZES}
+
+
+def closest_size(size: int) -> int:
+    return min(THUMBNAIL_SIZES, key=lambda s: abs(s - size))
+
+
+thumbnail_cache = ThumbnailCache()
@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import queue
+import random
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List
+
+import requests
+
+SERVICE_NAME = os.getenv('TRACING_SERVICE_NAME', 'revit-viewer-backend')
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+# Attributes copied from a parent span to its children so every span of a job can be found
+INHERITED_ATTRIBUTES = ('job_id',)
+
+_current_span: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('current_span', default=None)
+
+
+class SpanContext:
+    """Identifies a span so it can be used as a parent across tasks and threads"""
+
+    def __init__(self, trace_id: str, span_id: str, attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.attributes = attributes or {}
+
+    @classmethod
+    def from_traceparent(cls, header: Optional[str]) -> Optional['SpanContext']:
+        """Parse a W3C traceparent header ('00-<trace>-<span>-<flags>')"""
+        if not header:
+            return None
+        parts = header.split('-')
+        if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+            return None
+        return cls(parts[1], parts[2])
+
+    def to_traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+
+class Span:
+    def __init__(self, name: str, parent: Optional[SpanContext], kind: int, attributes: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = {k: parent.attributes[k] for k in INHERITED_ATTRIBUTES if parent and k in parent.attributes}
+        self.attributes.update(attributes)
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException):
+        self.error = f"{type(error).__name__}: {error}"
+
+    @property
+    def context(self) -> SpanContext:
+        return SpanContext(self.trace_id, self.span_id, self.attributes)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            'status': {'code': 2, 'message': self.error} if self.error else {'code': 1}
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+class _NoopSpan:
+    """Shared stand-in returned while tracing is disabled"""
+
+    trace_id = None
+    span_id = None
+    context = None
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def record_error(self, error: BaseException):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+class FileExporter:
+    """Append finished spans as JSON lines"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: List[Span]):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for span in spans:
+                f.write(json.dumps(span.to_otlp()) + '\n')
+
+
+class OTLPExporter:
+    """Send spans to an OTLP/HTTP collector using the JSON encoding"""
+
+    def __init__(self, endpoint: str):
+        self.url = endpoint.rstrip('/') + '/v1/traces'
+        self.session = requests.Session()
+
+    def export(self, spans: List[Span]):
+        payload = {
+            'resourceSpans': [{
+                'resource': {'attributes': [_otlp_attribute('service.name', SERVICE_NAME)]},
+                'scopeSpans': [{
+                    'scope': {'name': SERVICE_NAME},
+                    'spans': [span.to_otlp() for span in spans]
+                }]
+            }]
+        }
+        self.session.post(self.url, json=payload, timeout=5)
+
+
+class Tracer:
+    """Minimal OpenTelemetry-style tracer; a no-op unless an exporter is configured"""
+
+    def __init__(self, exporter=None, batch_size: int = 256, flush_interval: float = 2.0):
+        self.exporter = exporter
+        self.enabled = exporter is not None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        if self.enabled:
+            threading.Thread(target=self._export_loop, name='trace-exporter', daemon=True).start()
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[SpanContext] = None, kind: int = KIND_INTERNAL, **attributes):
+        """Start a span as a child of `parent` or of the current span"""
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+
+        if parent is None:
+            current = _current_span.get()
+            parent = current.context if current else None
+        span = Span(name, parent, kind, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_ns = time.time_ns()
+            self._queue.put(span)
+
+    def current_context(self) -> Optional[SpanContext]:
+        """Context of the active span, for handing to background workers"""
+        current = _current_span.get()
+        return current.context if current else None
+
+    def _export_loop(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0.01)))
+            except queue.Empty:
+                pass
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                try:
+                    self.exporter.export(batch)
+                except Exception as e:
+                    print(f"⚠️ Trace export failed ({len(batch)} spans): {e}")
+                batch = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+
+
+class TracingMiddleware:
+    """ASGI middleware wrapping each HTTP request in a server span
+
+    Continues an incoming traceparent and returns the server span's own
+    traceparent header. Written as plain ASGI so requests are not buffered
+    through BaseHTTPMiddleware.
+    """
+
+    def __init__(self, app, tracer: 'Tracer'):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get('headers') or [])
+        parent = SpanContext.from_traceparent(headers.get(b'traceparent', b'').decode('latin-1') or None)
+        with self.tracer.span(f"{scope['method']} {scope['path']}", parent=parent, kind=KIND_SERVER, **{
+            'http.method': scope['method'],
+            'http.target': scope['path']
+        }) as span:
+            async def send_with_context(message):
+                if message['type'] == 'http.response.start':
+                    span.set_attribute('http.status_code', message['status'])
+                    # Set by routing once the request has been matched
+                    job_id = scope.get('path_params', {}).get('job_id')
+                    if job_id:
+                        span.set_attribute('job_id', job_id)
+                    message['headers'] = list(message.get('headers', [])) + [
+                        (b'traceparent', span.context.to_traceparent().encode('latin-1'))
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_with_context)
+
+
+def create_tracer() -> Tracer:
+    """Build the tracer from TRACING_EXPORTER (none, file or otlp)"""
+    exporter_name = os.getenv('TRACING_EXPORTER', 'none').lower()
+    if exporter_name == 'file':
+        return Tracer(FileExporter(os.getenv('TRACING_FILE', './traces.jsonl')))
+    if exporter_name == 'otlp':
+        return Tracer(OTLPExporter(os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT', 'http://localhost:4318')))
+    return Tracer()
+
+
+tracer = create_tracer()
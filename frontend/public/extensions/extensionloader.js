@@ -26,33 +26,50 @@ function init(config){
     
     var Extensions = config.Extensions;
     var loaderconfig = {"initialload":false}
+    var pendingFiles = {};
     
-    console.log('📦 ExtensionLoader: Loading extension files for', Extensions.length, 'extensions');
-    Extensions.forEach(element => {
-        console.log('📦 Loading files for extension:', element.name);
-        let path = "extensions/"+element.name+"/contents/";
-        element.filestoload.cssfiles.forEach(ele => {
-            console.log('📦 Loading CSS:', path+ele);
-            loadjscssfile((path+ele), 'css');
-        });
-        element.filestoload.jsfiles.forEach(ele => {
-            console.log('📦 Loading JS:', path+ele);
-            loadjscssfile((path+ele), 'js');
-        });
-    });
+    // Extension files are fetched on first use rather than all at startup
+    console.log('📦 ExtensionLoader:', Extensions.length, 'extensions available (loaded on demand)');
+
+    function findExtension(name) {
+        return Extensions.find(element => element.name === name);
+    }
+
+    function ensureExtensionFiles(name) {
+        if (pendingFiles[name]) return pendingFiles[name];
+        let element = findExtension(name);
+        if (!element) {
+            // Built-in or already registered extension, nothing to fetch
+            return Promise.resolve();
+        }
+        if (element.bundle) {
+            // One hashed, precompressed bundle (JS with inlined CSS) served by the backend
+            console.log('📦 Loading bundle for extension:', name, element.bundle);
+            pendingFiles[name] = loadjscssfile(element.bundle, 'js');
+        } else {
+            console.log('📦 Loading files for extension:', name);
+            let path = "extensions/"+element.name+"/contents/";
+            let loads = element.filestoload.cssfiles.map(ele => loadjscssfile((path+ele), 'css'));
+            loads = loads.concat(element.filestoload.jsfiles.map(ele => loadjscssfile((path+ele), 'js')));
+            pendingFiles[name] = Promise.all(loads);
+        }
+        pendingFiles[name].catch(() => { delete pendingFiles[name]; });
+        return pendingFiles[name];
+    }
+
+    function loadCustomExtension(viewer, name, options) {
+        return ensureExtensionFiles(name).then(() => viewer.loadExtension(name, options));
+    }
     
     console.log('👂 ExtensionLoader: Setting up event listeners');
     document.addEventListener('loadextension',function(e){
         console.log('🎯 ExtensionLoader: loadextension event received:', e.detail);
         loaderconfig.Viewer = e.detail.viewer;
         
-        try {
-            console.log('🚀 ExtensionLoader: Loading extension via viewer.loadExtension()');
-            e.detail.viewer.loadExtension(e.detail.extension);
-            console.log('✅ ExtensionLoader: Extension loaded successfully');
-        } catch (error) {
-            console.error('❌ ExtensionLoader: Error loading extension:', error);
-        }
+        console.log('🚀 ExtensionLoader: Loading extension via viewer.loadExtension()');
+        loadCustomExtension(e.detail.viewer, e.detail.extension)
+            .then(() => console.log('✅ ExtensionLoader: Extension loaded successfully'))
+            .catch(error => console.error('❌ ExtensionLoader: Error loading extension:', error));
     });
     
     document.addEventListener('unloadextension',function(e){
@@ -102,12 +119,9 @@ function init(config){
             console.log('🔍 ExtensionLoader: Checking extension:', element.name, 'loadonstartup:', element.loadonstartup);
             if (element.loadonstartup === "true") {
                 console.log('🚀 ExtensionLoader: Loading startup extension:', element.name);
-                try {
-                    loaderconfig.Viewer.loadExtension(element.name);
-                    console.log('✅ ExtensionLoader: Startup extension loaded:', element.name);
-                } catch (error) {
-                    console.error('❌ ExtensionLoader: Error loading startup extension:', element.name, error);
-                }
+                loadCustomExtension(loaderconfig.Viewer, element.name)
+                    .then(() => console.log('✅ ExtensionLoader: Startup extension loaded:', element.name))
+                    .catch(error => console.error('❌ ExtensionLoader: Error loading startup extension:', element.name, error));
             }
         });
     }    
@@ -184,12 +198,12 @@ function init(config){
             console.log(editoptionindex);
             Extensions[editoptionindex].options = JSON.parse(document.getElementById('editextensionconfig').value);
             loaderconfig.Viewer.unloadExtension(Extensions[editoptionindex].name);
-            loaderconfig.Viewer.loadExtension(Extensions[editoptionindex].name,Extensions[editoptionindex].options);
+            loadCustomExtension(loaderconfig.Viewer, Extensions[editoptionindex].name, Extensions[editoptionindex].options);
         }
         function togglecustomextension(e) {
             console.log(e.target.value)
             if (e.target.checked) {
-                loaderconfig.Viewer.loadExtension(e.target.value,Extensions[parseInt(this.dataset.index)].options)
+                loadCustomExtension(loaderconfig.Viewer, e.target.value, Extensions[parseInt(this.dataset.index)].options)
             } else {
                 loaderconfig.Viewer.unloadExtension(e.target.value)
             }
@@ -233,25 +247,51 @@ function init(config){
     function loadjscssfile(filename, filetype){
         console.log('📦 ExtensionLoader: Loading file:', filename, 'type:', filetype);
         
-        if (filetype=="js"){ 
-            var fileref=document.createElement('script')
-            fileref.setAttribute("type","text/javascript")
-            fileref.setAttribute("src", filename)
-        }
-        else if (filetype=="css"){ 
-            var fileref=document.createElement("link")
-            fileref.setAttribute("rel", "stylesheet")
-            fileref.setAttribute("type", "text/css")
-            fileref.setAttribute("href", filename)
-        }
-        if (typeof fileref!="undefined");
-        document.getElementsByTagName("head")[0].appendChild(fileref);
-        
-        console.log('✅ ExtensionLoader: File loaded successfully:', filename);
+        return new Promise((resolve, reject) => {
+            if (filetype=="js"){ 
+                var fileref=document.createElement('script')
+                fileref.setAttribute("type","text/javascript")
+                fileref.setAttribute("src", filename)
+            }
+            else if (filetype=="css"){ 
+                var fileref=document.createElement("link")
+                fileref.setAttribute("rel", "stylesheet")
+                fileref.setAttribute("type", "text/css")
+                fileref.setAttribute("href", filename)
+            }
+            fileref.onload = () => {
+                console.log('✅ ExtensionLoader: File loaded successfully:', filename);
+                resolve();
+            };
+            fileref.onerror = () => {
+                console.error('❌ ExtensionLoader: Failed to load file:', filename);
+                fileref.remove();
+                reject(new Error('Failed to load ' + filename));
+            };
+            document.getElementsByTagName("head")[0].appendChild(fileref);
+        });
     }
 }   
 
 function loadJSON(callback) {   
+    // Prefer the backend manifest (bundled, hashed assets); fall back to the static config
+    console.log('📄 ExtensionLoader: Loading extension manifest');
+    var manifest = new XMLHttpRequest();
+    manifest.open('GET', '/api/extensions/manifest', true);
+    manifest.onreadystatechange = function () {
+        if (manifest.readyState != 4) return;
+        if (manifest.status == 200) {
+            console.log('✅ ExtensionLoader: Manifest loaded successfully');
+            callback(JSON.parse(manifest.responseText));
+        } else {
+            console.warn('⚠️ ExtensionLoader: Manifest unavailable, status:', manifest.status);
+            loadStaticConfig(callback);
+        }
+    };
+    manifest.send(null);
+}
+
+function loadStaticConfig(callback) {
     console.log('📄 ExtensionLoader: Loading config.json');
     var xobj = new XMLHttpRequest();
     xobj.overrideMimeType("application/json");
@@ -284,17 +284,30 @@ const ViewerDemo = ({ jobData }) => {
         try {
             console.log('🔍 Starting empty viewer setup for job:', jobData.job_id);
             
-            // Get viewer token (still needed for viewer initialization)
-            const tokenResponse = await axios.get(`/api/models/${jobData.job_id}/viewer-token`);
-            const token = tokenResponse.data.token;
+            // One round trip: viewer token, URN and viewables
+            const openResponse = await axios.get(`/api/models/${jobData.job_id}/open`);
+            const openData = openResponse.data;
+            const token = openData.token;
+            let tokenHandedOut = false;
             console.log('🔑 Got viewer token:', token ? 'Token received' : 'No token');
             
             // ✅ Initialize APS Viewer without loading any model
             const options = {
                 env: 'AutodeskProduction',
+                // Derivatives are streamed from the endpoint of the region they are stored in
+                api: openData.viewer_api || 'derivativeV2',
                 getAccessToken: function(onSuccess) {
-                    const expirationTimeSeconds = 60 * 60; // 1 hour
-                    onSuccess(token, expirationTimeSeconds);
+                    // The /open body may come from a 304, so the remaining lifetime is computed here
+                    const expiresIn = Math.floor(openData.expires_at - Date.now() / 1000);
+                    if (!tokenHandedOut && expiresIn > 60) {
+                        tokenHandedOut = true;
+                        onSuccess(token, expiresIn);
+                        return;
+                    }
+                    // Refreshes (and stale first tokens) always ask the server for a fresh token
+                    axios.get(`/api/models/${jobData.job_id}/viewer-token`)
+                        .then((response) => onSuccess(response.data.token, response.data.expires_in))
+                        .catch((error) => console.error('❌ Failed to refresh viewer token:', error));
                 }
             };
             
@@ -325,13 +338,13 @@ const ViewerDemo = ({ jobData }) => {
                     await viewerInstance.loadExtension('Autodesk.DefaultTools.NavTools', {});
 
                     // Load the translated SVF model into the viewer
-                    const modelInfoResponse = await axios.get(`/api/models/${jobData.job_id}/info`);
-                    const modelInfo = modelInfoResponse.data;
-                    const documentId = 'urn:' + modelInfo.urn;
+                    const documentId = openData.document_id;
                     Autodesk.Viewing.Document.load(
                       documentId,
                       (doc) => {
-                        const defaultModel = doc.getRoot().getDefaultGeometry();
+                        const defaultViewable = openData.default_viewable;
+                        const defaultModel = (defaultViewable && doc.getRoot().findByGuid(defaultViewable.guid))
+                            || doc.getRoot().getDefaultGeometry();
                         // This will trigger GEOMETRY_LOADED_EVENT which loads ClayExtension
                         viewerInstance.loadDocumentNode(doc, defaultModel);
                       },